@@ -1,8 +1,13 @@
 import secrets
 import hashlib
+import sys
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import AdminToken
+import admin_tokens
+import geolocation
+import migrations
+import rollups
 
 def generate_password():
     """Generate a new admin token and store its hash in the database."""
@@ -22,6 +27,8 @@ def generate_password():
         admin_token = AdminToken(token_hash=token_hash)
         db.add(admin_token)
         db.commit()
+        # Running admin workers drop their cached tokens, so the old one stops working now
+        admin_tokens.bump_generation()
         
         # Print the token (will only be shown once)
         print("\nNew admin token generated successfully!")
@@ -32,5 +39,30 @@ def generate_password():
     finally:
         db.close()
 
+def backfill_locations():
+    """Store locations on existing entries and contact messages that have none."""
+    updated = geolocation.backfill_locations()
+    print(f"Backfilled location for {updated} rows.")
+
+def compact_rollups():
+    """Rebuild all visit rollups from the raw entries."""
+    db = SessionLocal()
+    try:
+        days = rollups.compact(db, days=None)
+        print(f"Rebuilt visit rollups for {days} days.")
+    finally:
+        db.close()
+
+COMMANDS = {
+    "generate_password": generate_password,
+    "backfill_locations": backfill_locations,
+    "compact_rollups": compact_rollups,
+}
+
 if __name__ == "__main__":
-    generate_password() 
\ No newline at end of file
+    command = sys.argv[1] if len(sys.argv) > 1 else "generate_password"
+    if command not in COMMANDS:
+        print(f"Unknown command: {command}. Available: {', '.join(COMMANDS)}")
+        sys.exit(1)
+    migrations.upgrade()
+    COMMANDS[command]() 
\ No newline at end of file
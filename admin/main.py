@@ -1,22 +1,60 @@
+import asyncio
 import os
 import sys
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import admin, home, messages, portfolio, profile, settings, visitors, webhooks
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import engine
-import models
+import migrations
+import rollups
+import webhook_client
+from database import SessionLocal, async_engine
+from server_timing import ServerTimingMiddleware
+from static_files import IMMUTABLE, REVALIDATE, CachedStaticFiles, precompress
+
+# Seconds between reconciliations of recent visit rollups against raw entries
+ROLLUP_COMPACT_INTERVAL = 3600
+ADMIN_APP_DIST = "admin-app/dist"
+
+
+def compact_rollups():
+    db = SessionLocal()
+    try:
+        rollups.compact(db)
+    finally:
+        db.close()
+
+
+async def compact_rollups_periodically():
+    while True:
+        try:
+            await asyncio.to_thread(compact_rollups)
+        except Exception as e:
+            print(f"Error compacting visit rollups: {e}")
+        await asyncio.sleep(ROLLUP_COMPACT_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.path.isdir(ADMIN_APP_DIST):
+        await asyncio.to_thread(precompress, ADMIN_APP_DIST)
+    task = asyncio.create_task(compact_rollups_periodically())
+    yield
+    task.cancel()
+    webhook_client.close()
+    await async_engine.dispose()
+
 
 app = FastAPI(
     title="Admin Panel",
     description="Bonnici Portfolio Admin Panel",
-    version="0.5.0"
+    version="0.5.0",
+    lifespan=lifespan,
 )
 
-models.Base.metadata.create_all(bind=engine)
+migrations.upgrade()
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,7 +64,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/data", StaticFiles(directory="data"), name="data")
+app.add_middleware(ServerTimingMiddleware)
+
+# The admin shows images right after replacing them, so always revalidate
+app.mount("/data", CachedStaticFiles(directory="data", cache_control=REVALIDATE, precompressed=False), name="data")
 
 app.include_router(admin.router)
 app.include_router(home.router)
@@ -38,16 +79,16 @@ app.include_router(visitors.router)
 app.include_router(webhooks.router)
 
 # Serve React SPA
-if os.path.isdir("admin-app/dist"):
-    app.mount("/assets", StaticFiles(directory="admin-app/dist/assets"), name="spa-assets")
+if os.path.isdir(ADMIN_APP_DIST):
+    app.mount("/assets", CachedStaticFiles(directory=f"{ADMIN_APP_DIST}/assets", cache_control=IMMUTABLE), name="spa-assets")
+    dist_files = CachedStaticFiles(directory=ADMIN_APP_DIST, cache_control=REVALIDATE)
 
     @app.get("/{full_path:path}")
-    async def spa_fallback(full_path: str):
+    async def spa_fallback(full_path: str, request: Request):
         # Don't intercept API routes (auth routes are fine — different methods or registered first)
         if full_path.startswith("api/"):
             from fastapi import HTTPException
             raise HTTPException(status_code=404)
-        file_path = os.path.join("admin-app/dist", full_path)
-        if full_path and os.path.isfile(file_path):
-            return FileResponse(file_path)
-        return FileResponse("admin-app/dist/index.html")
+        listing = await dist_files.manifest.listing()
+        path = full_path if full_path and full_path in listing.files else "index.html"
+        return await dist_files.get_response(path, request.scope)
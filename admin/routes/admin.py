@@ -1,22 +1,28 @@
 import hashlib
+import time
 from datetime import datetime, timedelta
 from functools import wraps
 from fastapi import APIRouter, Request, Response, Depends
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
+from admin_tokens import token_cache
+from database import AsyncSessionLocal
 from models import AdminToken
+import server_timing
 
 router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def find_token(db: AsyncSession, token_hash: str):
+    result = await db.execute(select(AdminToken).where(AdminToken.token_hash == token_hash).limit(1))
+    return result.scalars().first()
 
 
 def require_admin(func):
@@ -25,29 +31,33 @@ def require_admin(func):
         token_hash = request.cookies.get("admin_token")
         if not token_hash:
             return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
-        db = SessionLocal()
-        try:
-            admin_token = db.query(AdminToken).filter(AdminToken.token_hash == token_hash).first()
-            if not admin_token:
-                response = JSONResponse(status_code=401, content={"detail": "Invalid token"})
-                response.delete_cookie("admin_token")
-                return response
-        finally:
-            db.close()
+        start = time.perf_counter()
+        if token_cache.is_valid(token_hash):
+            server_timing.record(request, "auth", time.perf_counter() - start, "cache")
+            return await func(request, *args, **kwargs)
+        async with AsyncSessionLocal() as db:
+            admin_token = await find_token(db, token_hash)
+        server_timing.record(request, "auth", time.perf_counter() - start, "db")
+        if not admin_token:
+            response = JSONResponse(status_code=401, content={"detail": "Invalid token"})
+            response.delete_cookie("admin_token")
+            return response
+        token_cache.remember(token_hash)
         return await func(request, *args, **kwargs)
     return wrapper
 
 
 @router.post("/login")
-async def login(request: Request, db: Session = Depends(get_db)):
+async def login(request: Request, db: AsyncSession = Depends(get_db)):
     form = await request.form()
     token = form.get("token")
     if not token:
         return JSONResponse(status_code=400, content={"error": "Token is required"})
     token_hash = hashlib.sha256(token.encode()).hexdigest()
-    admin_token = db.query(AdminToken).filter(AdminToken.token_hash == token_hash).first()
+    admin_token = await find_token(db, token_hash)
     if not admin_token:
         return JSONResponse(status_code=401, content={"error": "Invalid token"})
+    token_cache.remember(token_hash)
     response = JSONResponse(content={"status": "success"})
     response.set_cookie(
         key="admin_token",
@@ -2,21 +2,19 @@ import os
 import sys
 from datetime import datetime
 from fastapi import APIRouter, Depends, Request
-from sqlalchemy import func, distinct
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from database import SessionLocal
-from models import ContactMessage, Entry
+from database import AsyncSessionLocal
+from models import ContactMessage
+import rollups
 from .admin import require_admin
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 router = APIRouter(prefix="/api", tags=["dashboard"])
@@ -24,20 +22,14 @@ router = APIRouter(prefix="/api", tags=["dashboard"])
 
 @router.get("/dashboard")
 @require_admin
-async def dashboard(request: Request, db: Session = Depends(get_db)):
-    today = datetime.now().date()
-    unread = db.query(ContactMessage).filter(
+async def dashboard(request: Request, db: AsyncSession = Depends(get_db)):
+    unread = await db.scalar(select(func.count(ContactMessage.id)).where(
         ContactMessage.viewed == False,
         ContactMessage.archived == False,
-    ).count()
-    visitors_today = db.query(distinct(Entry.ip_address)).filter(
-        func.date(Entry.created) == today
-    ).count()
-    views_today = db.query(Entry).filter(
-        func.date(Entry.created) == today
-    ).count()
+    ))
+    today = await db.run_sync(rollups.summary, since=datetime.now())
     return {
         "unread_messages": unread,
-        "visitors_today": visitors_today,
-        "page_views_today": views_today,
+        "visitors_today": today["unique"],
+        "page_views_today": today["views"],
     }
@@ -2,21 +2,25 @@ import os
 import sys
 from uuid import UUID
 from fastapi import APIRouter, Depends, Request, HTTPException
-from sqlalchemy.orm import Session
-import requests
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from database import SessionLocal
+from database import AsyncSessionLocal
 from models import ContactMessage
 from .admin import require_admin
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def get_message_or_404(db: AsyncSession, message_id: UUID) -> ContactMessage:
+    msg = await db.get(ContactMessage, message_id)
+    if not msg:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return msg
 
 
 router = APIRouter(prefix="/api/messages", tags=["messages"])
@@ -24,11 +28,11 @@ router = APIRouter(prefix="/api/messages", tags=["messages"])
 
 @router.get("")
 @require_admin
-async def list_messages(request: Request, unread: bool = False, db: Session = Depends(get_db)):
-    query = db.query(ContactMessage).filter(ContactMessage.archived == False)
+async def list_messages(request: Request, unread: bool = False, db: AsyncSession = Depends(get_db)):
+    query = select(ContactMessage).where(ContactMessage.archived == False)
     if unread:
-        query = query.filter(ContactMessage.viewed == False)
-    msgs = query.order_by(ContactMessage.created.desc()).all()
+        query = query.where(ContactMessage.viewed == False)
+    msgs = (await db.execute(query.order_by(ContactMessage.created.desc()))).scalars().all()
     return [
         {
             "id": str(m.id),
@@ -47,34 +51,20 @@ async def list_messages(request: Request, unread: bool = False, db: Session = De
 
 @router.delete("")
 @require_admin
-async def delete_all(request: Request, db: Session = Depends(get_db)):
+async def delete_all(request: Request, db: AsyncSession = Depends(get_db)):
     try:
-        db.query(ContactMessage).delete()
-        db.commit()
+        await db.execute(delete(ContactMessage))
+        await db.commit()
         return {"status": "success"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/{message_id}")
 @require_admin
-async def get_message(request: Request, message_id: UUID, db: Session = Depends(get_db)):
-    msg = db.query(ContactMessage).filter(ContactMessage.id == message_id).first()
-    if not msg:
-        raise HTTPException(status_code=404, detail="Message not found")
-
-    ip_info = None
-    if msg.ip_address:
-        ip = "8.8.8.8" if msg.ip_address == "127.0.0.1" else msg.ip_address
-        try:
-            r = requests.get(f"http://ip-api.com/json/{ip}", timeout=5)
-            if r.status_code == 200:
-                data = r.json()
-                if data.get("status") == "success":
-                    ip_info = data
-        except Exception:
-            pass
+async def get_message(request: Request, message_id: UUID, db: AsyncSession = Depends(get_db)):
+    msg = await get_message_or_404(db, message_id)
 
     return {
         "id": str(msg.id),
@@ -86,41 +76,35 @@ async def get_message(request: Request, message_id: UUID, db: Session = Depends(
         "viewed": msg.viewed,
         "archived": msg.archived,
         "ip_address": msg.ip_address,
-        "country": ip_info.get("country") if ip_info else None,
-        "city": ip_info.get("city") if ip_info else None,
-        "latitude": ip_info.get("lat") if ip_info else None,
-        "longitude": ip_info.get("lon") if ip_info else None,
+        "country": msg.country,
+        "city": msg.city,
+        "latitude": msg.latitude,
+        "longitude": msg.longitude,
     }
 
 
 @router.post("/{message_id}/read")
 @require_admin
-async def mark_read(request: Request, message_id: UUID, db: Session = Depends(get_db)):
-    msg = db.query(ContactMessage).filter(ContactMessage.id == message_id).first()
-    if not msg:
-        raise HTTPException(status_code=404, detail="Message not found")
+async def mark_read(request: Request, message_id: UUID, db: AsyncSession = Depends(get_db)):
+    msg = await get_message_or_404(db, message_id)
     msg.viewed = True
-    db.commit()
+    await db.commit()
     return {"status": "success"}
 
 
 @router.post("/{message_id}/unread")
 @require_admin
-async def mark_unread(request: Request, message_id: UUID, db: Session = Depends(get_db)):
-    msg = db.query(ContactMessage).filter(ContactMessage.id == message_id).first()
-    if not msg:
-        raise HTTPException(status_code=404, detail="Message not found")
+async def mark_unread(request: Request, message_id: UUID, db: AsyncSession = Depends(get_db)):
+    msg = await get_message_or_404(db, message_id)
     msg.viewed = False
-    db.commit()
+    await db.commit()
     return {"status": "success"}
 
 
 @router.delete("/{message_id}")
 @require_admin
-async def delete_message(request: Request, message_id: UUID, db: Session = Depends(get_db)):
-    msg = db.query(ContactMessage).filter(ContactMessage.id == message_id).first()
-    if not msg:
-        raise HTTPException(status_code=404, detail="Message not found")
-    db.delete(msg)
-    db.commit()
+async def delete_message(request: Request, message_id: UUID, db: AsyncSession = Depends(get_db)):
+    msg = await get_message_or_404(db, message_id)
+    await db.delete(msg)
+    await db.commit()
     return {"status": "success"}
@@ -1,46 +1,28 @@
 import os
 import sys
-import json
 import uuid
 import base64
 import io
+import json
 from datetime import datetime
 from fastapi import APIRouter, Request, HTTPException, Body
 from PIL import Image
 from .admin import require_admin
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config_manager import ConfigManager, if_match_version
 
 PORTFOLIO_IMAGE_DIR = "data/images/portfolio"
-CONFIG_FILE = "data/config.json"
 
 router = APIRouter(prefix="/api/portfolio", tags=["portfolio"])
 
 
-def read_config():
-    try:
-        with open(CONFIG_FILE, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {"portfolio": {"enabled": True, "projects": []}}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-def save_config(config):
-    try:
-        os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(config, f, indent=4)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
 @router.get("")
 @require_admin
 async def get_portfolio(request: Request):
-    config = read_config()
-    portfolio = config.get("portfolio", {"enabled": True, "columns": 2, "mode": "tags", "projects": []})
+    section = ConfigManager.snapshot().sections.get("portfolio")
+    # Private copy of just this section: image_url is filled in below
+    portfolio = json.loads(section.body) if section is not None else {"enabled": True, "columns": 2, "mode": "tags", "projects": []}
     for project in portfolio.get("projects", []):
         if "image" in project and project["image"] and "image_url" not in project:
             name = project["image"]
@@ -53,13 +35,19 @@ async def get_portfolio(request: Request):
         "columns": portfolio.get("columns", 2),
         "mode": portfolio.get("mode", "tags"),
         "projects": portfolio.get("projects", []),
+        "version": section.version if section is not None else ConfigManager.version(),
     }
 
 
 @router.post("")
 @require_admin
 async def save_portfolio(request: Request, data: dict = Body(...)):
+    """Replace the portfolio section; send the version from GET as If-Match to refuse overwriting newer changes (409).
+
+    The version is the portfolio section's own, so profile edits in between do not conflict.
+    """
     try:
+        expected_version = if_match_version(request.headers.get("if-match"))
         os.makedirs(PORTFOLIO_IMAGE_DIR, exist_ok=True)
         projects = data.get("projects", [])
         for i, project in enumerate(projects):
@@ -80,15 +68,16 @@ async def save_portfolio(request: Request, data: dict = Body(...)):
                 except Exception as e:
                     raise HTTPException(status_code=400, detail=f"Image processing failed: {e}")
 
-        config = read_config()
-        if "portfolio" not in config:
-            config["portfolio"] = {}
-        config["portfolio"]["projects"] = projects
-        config["portfolio"]["enabled"] = data.get("enabled", True)
-        config["portfolio"]["columns"] = data.get("columns", 2)
-        config["portfolio"]["mode"] = data.get("mode", "tags")
-        save_config(config)
-        return {"status": "success"}
+        def apply(config):
+            if "portfolio" not in config:
+                config["portfolio"] = {}
+            config["portfolio"]["projects"] = projects
+            config["portfolio"]["enabled"] = data.get("enabled", True)
+            config["portfolio"]["columns"] = data.get("columns", 2)
+            config["portfolio"]["mode"] = data.get("mode", "tags")
+
+        _, version = ConfigManager.modify(apply, expected_version, section="portfolio")
+        return {"status": "success", "version": version}
     except HTTPException:
         raise
     except Exception as e:
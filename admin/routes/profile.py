@@ -7,7 +7,7 @@ from fastapi import APIRouter, Request, HTTPException, UploadFile, File, Form, B
 from fastapi.responses import JSONResponse
 from PIL import Image
 from colorthief import ColorThief
-from config_manager import ConfigManager
+from config_manager import ConfigManager, if_match_version
 from .admin import require_admin
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -75,13 +75,15 @@ def extract_colors_from_image(img):
 @require_admin
 async def get_profile(request: Request):
     try:
-        config = ConfigManager.read_config()
+        snapshot = ConfigManager.snapshot()
+        config = snapshot.data
         return {
             "main_info": config["main_info"],
             "contact_card": config["contact_card"],
             "about_me": config["about_me"],
             "what_im_doing": config["what_im_doing"],
             "skills": config.get("skills", {"sections": {}}),
+            "version": snapshot.version,
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -96,8 +98,11 @@ async def update_profile(request: Request, updates: Dict[str, Any] = Body(...)):
                 if "image" in panel and panel["image"]:
                     panel["image"] = update_svg_color(panel["image"])
                     panel["image"] = standardize_svg_attributes(panel["image"])
-        updated_config = ConfigManager.update_config(updates)
-        return {"status": "success", "data": updated_config}
+        # The version this write produced: one read afterwards may already include another writer's change
+        updated_config, version = ConfigManager.update_config(updates, if_match_version(request.headers.get("if-match")))
+        return {"status": "success", "data": updated_config, "version": version}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -13,9 +13,10 @@ from sqlalchemy.orm import Session
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from database import SessionLocal
 from models import Webhook
+from config_manager import CONFIG_FILE, ConfigManager
+from webhook_payloads import detect_platform
 from .admin import require_admin
 
-CONFIG_FILE = "data/config.json"
 IMAGES_DIR = "data/images"
 
 
@@ -71,8 +72,7 @@ async def export_data(request: Request, db: Session = Depends(get_db)):
         # Read config
         if not os.path.isfile(CONFIG_FILE):
             raise HTTPException(status_code=404, detail="config.json not found")
-        with open(CONFIG_FILE, "r") as f:
-            config = json.load(f)
+        config = ConfigManager.snapshot().data
 
         # Serialize webhooks
         webhooks = db.query(Webhook).all()
@@ -120,9 +120,7 @@ async def import_data(request: Request, file: UploadFile = File(...), db: Sessio
             try:
                 config_bytes = zf.read("config.json")
                 config = json.loads(config_bytes)
-                os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-                with open(CONFIG_FILE, "w") as f:
-                    json.dump(config, f, indent=4)
+                ConfigManager.write_config(config)
                 extracted.append("config.json")
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"Failed to restore config.json: {e}")
@@ -134,7 +132,7 @@ async def import_data(request: Request, file: UploadFile = File(...), db: Sessio
                     db.query(Webhook).delete()
                     for wh in wh_data:
                         if wh.get("name") and wh.get("url"):
-                            db.add(Webhook(id=uuid.uuid4(), name=wh["name"], url=wh["url"], created=datetime.now()))
+                            db.add(Webhook(id=uuid.uuid4(), name=wh["name"], url=wh["url"], platform=detect_platform(wh["url"]), created=datetime.now()))
                     db.commit()
                     extracted.append("webhooks.json")
                 except Exception as e:
@@ -1,49 +1,114 @@
 import os
 import sys
-import json
+import base64
 from datetime import datetime, timedelta
+from typing import Optional
 from uuid import UUID
-from concurrent.futures import ThreadPoolExecutor
-from sqlalchemy import func, distinct
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, Request, HTTPException
-import requests
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from database import SessionLocal
+from database import AsyncSessionLocal
 from models import Entry
+import rollups
+import visits
 from .admin import require_admin
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def get_location_info(ip_address: str) -> dict:
-    if not ip_address or ip_address == "127.0.0.1":
-        return {"country": "Local", "city": "Local"}
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 500
+
+# Selectable output fields of the visitors list; id and created are always returned
+VISITOR_FIELDS = {
+    "ip_address": Entry.ip_address,
+    "is_bot": Entry.is_bot,
+    "user_agent": Entry.user_agent,
+    "device_family": Entry.device_family,
+    "device_brand": Entry.device_brand,
+    "device_model": Entry.device_model,
+    "os_family": Entry.os_family,
+    "os_version": Entry.os_version,
+    "browser_family": Entry.browser_family,
+    "browser_version": Entry.browser_version,
+    "screen_width": Entry.screen_width,
+    "screen_height": Entry.screen_height,
+    "viewport_width": Entry.viewport_width,
+    "viewport_height": Entry.viewport_height,
+    "pixel_ratio": Entry.pixel_ratio,
+    "language": Entry.language,
+    "device_memory": Entry.device_memory,
+    "cpu_cores": Entry.cpu_cores,
+    "country": Entry.country,
+    "city": Entry.city,
+    "region": Entry.region,
+    "lat": Entry.latitude,
+    "lon": Entry.longitude,
+    "timezone": Entry.timezone,
+    "isp": Entry.isp,
+}
+
+
+# The nested objects the admin SPA reads, rebuilt from the typed columns they were once stored as
+LEGACY_FIELDS = {
+    "device_info": (Entry.device_family, Entry.device_brand, Entry.device_model, Entry.os_family, Entry.os_version),
+    "browser_info": (Entry.browser_family, Entry.browser_version, Entry.user_agent),
+    "system_info": (Entry.language, Entry.device_memory, Entry.cpu_cores),
+    "display_info": (Entry.screen_width, Entry.screen_height, Entry.viewport_width, Entry.viewport_height, Entry.pixel_ratio),
+}
+
+
+def selected_columns(selected: list[str]) -> list:
+    """The Entry columns needed for ``selected`` fields, each once."""
+    columns = {}
+    for name in selected:
+        for column in LEGACY_FIELDS.get(name, (VISITOR_FIELDS.get(name),)):
+            columns[column.key] = column
+    return list(columns.values())
+
+
+def legacy_fields(row) -> dict:
+    fields = {column.key: getattr(row, column.key, None) for columns in LEGACY_FIELDS.values() for column in columns}
+    device_str, os_str, browser_str, resolution_str, additional_info = visits.describe(fields)
+    return {
+        "device_info": {"device": device_str, "os": os_str},
+        "browser_info": {"browser": browser_str, "user_agent": fields["user_agent"]},
+        "system_info": {"additional": additional_info},
+        "display_info": {"resolution": resolution_str},
+    }
+
+
+def visitor_item(row, selected: list[str]) -> dict:
+    item = {"id": str(row.id), "created": row.created.isoformat()}
+    legacy = legacy_fields(row) if any(name in LEGACY_FIELDS for name in selected) else {}
+    for name in selected:
+        if name in legacy:
+            item[name] = legacy[name]
+            continue
+        value = getattr(row, VISITOR_FIELDS[name].key)
+        if name in ("country", "city") and value is None:
+            value = "Unknown"
+        item[name] = value
+    return item
+
+
+def encode_cursor(created: datetime, entry_id: UUID) -> str:
+    raw = f"{created.isoformat()}|{entry_id.hex}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
     try:
-        r = requests.get(f"http://ip-api.com/json/{ip_address}", timeout=5)
-        if r.status_code == 200:
-            data = r.json()
-            if data.get("status") == "success":
-                return {
-                    "country": data.get("country"),
-                    "city": data.get("city"),
-                    "lat": data.get("lat"),
-                    "lon": data.get("lon"),
-                    "region": data.get("regionName"),
-                    "timezone": data.get("timezone"),
-                    "isp": data.get("isp"),
-                    "org": data.get("org"),
-                }
-    except Exception as e:
-        print(f"Error getting location for {ip_address}: {e}")
-    return {"country": "Unknown", "city": "Unknown"}
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created, entry_id = raw.split("|")
+        return datetime.fromisoformat(created), UUID(entry_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 router = APIRouter(prefix="/api/visitors", tags=["visitors"])
@@ -51,70 +116,100 @@ router = APIRouter(prefix="/api/visitors", tags=["visitors"])
 
 @router.get("")
 @require_admin
-async def get_visitors(request: Request, db: Session = Depends(get_db)):
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    last_week = today - timedelta(days=7)
-
-    total_unique = db.query(func.count(distinct(Entry.ip_address))).scalar()
-    total_views = db.query(func.count(Entry.id)).scalar()
-    today_unique = db.query(func.count(distinct(Entry.ip_address))).filter(Entry.created >= today).scalar()
-    today_views = db.query(func.count(Entry.id)).filter(Entry.created >= today).scalar()
-    last7_unique = db.query(func.count(distinct(Entry.ip_address))).filter(Entry.created >= last_week).scalar()
-    last7_views = db.query(func.count(Entry.id)).filter(Entry.created >= last_week).scalar()
-
-    recent = db.query(Entry).order_by(Entry.created.desc()).limit(200).all()
-    unique_ips = {v.ip_address for v in recent if v.ip_address}
-
-    ip_locations: dict = {}
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(get_location_info, ip): ip for ip in unique_ips}
-        for future, ip in futures.items():
-            ip_locations[ip] = future.result()
-
-    visitors_out = []
-    for v in recent:
-        loc = ip_locations.get(v.ip_address, {})
-        di = json.loads(v.device_info) if v.device_info else {}
-        bi = json.loads(v.browser_info) if v.browser_info else {}
-        si = json.loads(v.system_info) if v.system_info else {}
-        dsi = json.loads(v.display_info) if v.display_info else {}
-        visitors_out.append({
-            "id": str(v.id),
-            "created": v.created.isoformat(),
-            "ip_address": v.ip_address,
-            "device_info": di,
-            "browser_info": bi,
-            "system_info": si,
-            "display_info": dsi,
-            **loc,
-        })
-
-    return {
-        "total_unique": total_unique,
-        "total_views": total_views,
-        "today_unique": today_unique,
-        "today_views": today_views,
-        "last7_unique": last7_unique,
-        "last7_views": last7_views,
+async def get_visitors(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    ip: Optional[str] = None,
+    country: Optional[str] = None,
+    device: Optional[str] = None,
+    bot: Optional[bool] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Newest-first page of visits, keyset-paginated on (created, id).
+
+    Pass the returned ``next_cursor`` back as ``cursor`` for the next page.
+    ``fields`` is a comma-separated subset of VISITOR_FIELDS and LEGACY_FIELDS (all by default).
+    Totals are only computed for the first page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    selected = [*VISITOR_FIELDS, *LEGACY_FIELDS] if not fields else [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in VISITOR_FIELDS and f not in LEGACY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    query = select(Entry.id, Entry.created, *selected_columns(selected))
+    if cursor:
+        after_created, after_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Entry.created < after_created,
+            and_(Entry.created == after_created, Entry.id < after_id),
+        ))
+    if since:
+        query = query.where(Entry.created >= since)
+    if until:
+        query = query.where(Entry.created < until)
+    if ip:
+        query = query.where(Entry.ip_address == ip)
+    if country:
+        query = query.where(Entry.country == country)
+    if device:
+        query = query.where(Entry.device_family == device)
+    if bot is not None:
+        query = query.where(Entry.is_bot == bot)
+    rows = (await db.execute(query.order_by(Entry.created.desc(), Entry.id.desc()).limit(limit + 1))).all()
+
+    visitors_out = [visitor_item(row, selected) for row in rows[:limit]]
+
+    result = {
         "visitors": visitors_out,
+        "next_cursor": encode_cursor(rows[limit - 1].created, rows[limit - 1].id) if len(rows) > limit else None,
     }
+    if not cursor:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        last_week = today - timedelta(days=7)
+        total, today_stats, last7 = await db.run_sync(
+            lambda session: [rollups.summary(session, since=day) for day in (None, today, last_week)]
+        )
+        result.update({
+            "total_unique": total["unique"],
+            "total_views": total["views"],
+            "today_unique": today_stats["unique"],
+            "today_views": today_stats["views"],
+            "last7_unique": last7["unique"],
+            "last7_views": last7["views"],
+        })
+    return result
+
+
+@router.get("/stats")
+@require_admin
+async def get_visitor_stats(request: Request, days: int = 7, db: AsyncSession = Depends(get_db)):
+    """Daily series and device/browser/country breakdowns, read from the rollup tables."""
+    days = max(1, min(days, 366))
+    since = datetime.now() - timedelta(days=days - 1)
+
+    def stats(session):
+        return {
+            "days": days,
+            **rollups.summary(session, since=since),
+            "daily": rollups.series(session, "day", since),
+            "hourly": rollups.series(session, "hour", datetime.now() - timedelta(hours=23)),
+            "breakdown": {dimension: rollups.breakdown(session, dimension, since) for dimension in rollups.BREAKDOWNS},
+        }
+
+    # The rollup helpers take a sync Session; run_sync gives them one on the same aiosqlite connection
+    return await db.run_sync(stats)
 
 
 @router.get("/{entry_id}")
 @require_admin
-async def get_visitor(request: Request, entry_id: UUID, db: Session = Depends(get_db)):
-    entry = db.query(Entry).filter(Entry.id == entry_id).first()
+async def get_visitor(request: Request, entry_id: UUID, db: AsyncSession = Depends(get_db)):
+    entry = await db.get(Entry, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
 
-    loc = get_location_info(entry.ip_address)
-    return {
-        "id": str(entry.id),
-        "created": entry.created.isoformat(),
-        "ip_address": entry.ip_address,
-        "device_info": json.loads(entry.device_info) if entry.device_info else {},
-        "browser_info": json.loads(entry.browser_info) if entry.browser_info else {},
-        "system_info": json.loads(entry.system_info) if entry.system_info else {},
-        "display_info": json.loads(entry.display_info) if entry.display_info else {},
-        **loc,
-    }
+    return visitor_item(entry, [*VISITOR_FIELDS, *LEGACY_FIELDS])
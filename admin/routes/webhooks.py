@@ -2,13 +2,18 @@ import os
 import sys
 import uuid
 from datetime import datetime
+from typing import Optional
+from uuid import UUID
 from fastapi import APIRouter, Request, Depends, HTTPException, Body
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-import requests
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from database import SessionLocal
-from models import Webhook
+from models import Webhook, WebhookDelivery
+import outbox
+import webhook_client
+import webhook_payloads
 from .admin import require_admin
 
 
@@ -20,37 +25,19 @@ def get_db():
         db.close()
 
 
-def detect_platform(url: str) -> str:
-    u = url.lower()
-    if "discord.com/api/webhooks" in u:
-        return "discord"
-    if "hooks.slack.com" in u:
-        return "slack"
-    if "webhook.office.com" in u or "office365.com" in u:
-        return "teams"
-    return "generic"
-
-
-def format_visitor_payload(platform: str) -> dict:
-    ts = datetime.now()
-    if platform == "discord":
-        return {"embeds": [{"title": "🔔 New Website Visit (Test)", "color": 5763719, "fields": [{"name": "Device", "value": "Test Device", "inline": True}, {"name": "Time", "value": ts.strftime("%Y-%m-%d %H:%M:%S"), "inline": True}], "footer": {"text": "Test notification"}}]}
-    if platform == "slack":
-        return {"blocks": [{"type": "header", "text": {"type": "plain_text", "text": "🔔 New Website Visit (Test)", "emoji": True}}, {"type": "context", "elements": [{"type": "mrkdwn", "text": f"Test at {ts.strftime('%Y-%m-%d %H:%M:%S')}"}]}]}
-    if platform == "teams":
-        return {"@type": "MessageCard", "@context": "http://schema.org/extensions", "summary": "Test Visit", "sections": [{"activityTitle": "🔔 New Website Visit (Test)", "text": "This is a test notification"}]}
-    return {"event": "visitor", "test": True, "timestamp": ts.isoformat()}
-
-
-def format_message_payload(platform: str) -> dict:
-    ts = datetime.now()
-    if platform == "discord":
-        return {"embeds": [{"title": "📨 New Message (Test)", "color": 16776960, "fields": [{"name": "From", "value": "Test User", "inline": True}, {"name": "Email", "value": "test@example.com", "inline": True}, {"name": "Message", "value": "This is a test message."}], "footer": {"text": "Test notification"}}]}
-    if platform == "slack":
-        return {"blocks": [{"type": "header", "text": {"type": "plain_text", "text": "📨 New Message (Test)", "emoji": True}}, {"type": "section", "fields": [{"type": "mrkdwn", "text": "*From:*\nTest User"}, {"type": "mrkdwn", "text": "*Email:*\ntest@example.com"}]}]}
-    if platform == "teams":
-        return {"@type": "MessageCard", "@context": "http://schema.org/extensions", "summary": "Test Message", "sections": [{"activityTitle": "📨 New Message (Test)", "text": "This is a test message."}]}
-    return {"event": "message", "test": True, "timestamp": ts.isoformat()}
+def delivery_item(row: WebhookDelivery) -> dict:
+    return {
+        "id": str(row.id),
+        "event": row.event,
+        "url": row.url,
+        "platform": row.platform,
+        "status": row.status,
+        "attempts": row.attempts,
+        "last_error": row.last_error,
+        "next_attempt_at": row.next_attempt_at.isoformat() if row.status in (outbox.PENDING, outbox.SENDING) else None,
+        "created": row.created.isoformat(),
+        "delivered": row.delivered.isoformat() if row.delivered else None,
+    }
 
 
 router = APIRouter(prefix="/api/webhooks", tags=["webhooks"])
@@ -66,7 +53,7 @@ async def get_webhooks(request: Request, db: Session = Depends(get_db)):
     }
     for w in webhooks:
         if w.name in config:
-            config[w.name] = {"enabled": True, "url": w.url}
+            config[w.name] = {"enabled": True, "url": w.url, "platform": w.platform}
     return config
 
 
@@ -78,7 +65,7 @@ async def save_webhooks(request: Request, data: dict = Body(...), db: Session =
         for key in ("message", "visitor"):
             wh = data.get(key, {})
             if wh.get("enabled") and wh.get("url"):
-                db.add(Webhook(id=uuid.uuid4(), name=key, url=wh["url"], created=datetime.now()))
+                db.add(Webhook(id=uuid.uuid4(), name=key, url=wh["url"], platform=webhook_payloads.detect_platform(wh["url"]), created=datetime.now()))
         db.commit()
         return {"status": "success"}
     except Exception as e:
@@ -92,24 +79,58 @@ async def test_webhook(request: Request, webhook_type: str, data: dict = Body(..
     url = data.get("url")
     if not url:
         raise HTTPException(status_code=400, detail="URL is required")
-    platform = detect_platform(url)
-    if webhook_type == "visitor":
-        payload = format_visitor_payload(platform)
-    elif webhook_type == "message":
-        payload = format_message_payload(platform)
-    else:
+    if webhook_type not in webhook_payloads.EVENTS:
         raise HTTPException(status_code=400, detail=f"Unknown webhook type: {webhook_type}")
-    try:
-        r = requests.post(url, json=payload, headers={"Content-Type": "application/json"}, timeout=5)
-        if 200 <= r.status_code < 300:
-            return {"status": "success", "platform": platform}
-        raise HTTPException(status_code=400, detail=f"Webhook returned {r.status_code}: {r.text}")
-    except requests.RequestException as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    platform = webhook_payloads.detect_platform(url)
+    # Same renderer as real notifications, filled with sample data
+    payload = webhook_payloads.render(platform, webhook_type, webhook_payloads.sample(webhook_type))
+    # One retry only: the admin is waiting on the result
+    result = await webhook_client.deliver(url, payload, attempts=2)
+    if result.ok:
+        return {"status": "success", "platform": platform}
+    raise HTTPException(status_code=400, detail=result.error)
+
+
+@router.get("/deliveries")
+@require_admin
+async def get_deliveries(request: Request, status: Optional[str] = None, event: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db)):
+    """Recent outbox deliveries, newest first, with per-status totals."""
+    if status and status not in outbox.STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {status}")
+    query = db.query(WebhookDelivery)
+    if status:
+        query = query.filter(WebhookDelivery.status == status)
+    if event:
+        query = query.filter(WebhookDelivery.event == event)
+    rows = query.order_by(WebhookDelivery.created.desc()).limit(max(1, min(limit, 200))).all()
+    counts = dict(db.query(WebhookDelivery.status, func.count()).group_by(WebhookDelivery.status).all())
+    return {
+        "deliveries": [delivery_item(r) for r in rows],
+        "counts": {s: counts.get(s, 0) for s in outbox.STATUSES},
+    }
+
+
+@router.post("/deliveries/replay")
+@require_admin
+async def replay_deliveries(request: Request, db: Session = Depends(get_db)):
+    """Queue every dead-lettered delivery again."""
+    return {"status": "success", "replayed": outbox.replay(db)}
+
+
+@router.post("/deliveries/{delivery_id}/replay")
+@require_admin
+async def replay_delivery(request: Request, delivery_id: UUID, db: Session = Depends(get_db)):
+    row = db.query(WebhookDelivery).filter(WebhookDelivery.id == delivery_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Delivery not found")
+    if row.status == outbox.SENDING:
+        raise HTTPException(status_code=409, detail="Delivery is being sent")
+    outbox.replay(db, [delivery_id])
+    return {"status": "success"}
 
 
 @router.post("/detect-platform")
 @require_admin
 async def detect_platform_endpoint(request: Request, data: dict = Body(...)):
     url = data.get("url", "")
-    return {"platform": detect_platform(url) if url else "unknown"}
+    return {"platform": webhook_payloads.detect_platform(url) if url else "unknown"}
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Validated admin tokens are trusted this long without asking the database
+ADMIN_TOKEN_CACHE_TTL = float(os.environ.get("ADMIN_TOKEN_CACHE_TTL", "60"))
+# Rewritten by `generate_password`; every admin worker drops its cache when it changes
+GENERATION_FILE = "data/admin_token.generation"
+# Only one token exists at a time; a few more cover a rotation in progress
+MAX_TOKENS = 16
+
+
+def _generation_stamp() -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(GENERATION_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+def bump_generation() -> None:
+    """Invalidate every cached token in every process (call after changing admin_token)."""
+    os.makedirs(os.path.dirname(GENERATION_FILE), exist_ok=True)
+    tmp = f"{GENERATION_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(str(time.time_ns()))
+    # A new inode, so the stamp changes even within the filesystem's mtime resolution
+    os.replace(tmp, GENERATION_FILE)
+
+
+class TokenCache:
+    """Token hashes that passed the database check, kept for ``ttl`` seconds.
+
+    Lookups compare the generation file's stamp (one stat call) and start
+    over when it changed, so a new admin token revokes the old one in every
+    worker immediately; the TTL bounds how long a token deleted by other
+    means keeps working. Only valid tokens are cached.
+    """
+
+    def __init__(self, ttl: float = ADMIN_TOKEN_CACHE_TTL, maxsize: int = MAX_TOKENS):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._tokens: "OrderedDict[str, float]" = OrderedDict()
+        self._generation = _generation_stamp()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_generation(self) -> None:
+        stamp = _generation_stamp()
+        if stamp != self._generation:
+            self._generation = stamp
+            self._tokens.clear()
+            self.invalidations += 1
+
+    def is_valid(self, token_hash: str) -> bool:
+        """True if the token was validated recently and no new token was generated since."""
+        if self.ttl <= 0:
+            return False
+        with self._lock:
+            self._check_generation()
+            expires = self._tokens.get(token_hash)
+            if expires is not None and expires > time.monotonic():
+                self.hits += 1
+                return True
+            self._tokens.pop(token_hash, None)
+            self.misses += 1
+            return False
+
+    def remember(self, token_hash: str) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._check_generation()
+            self._tokens[token_hash] = time.monotonic() + self.ttl
+            self._tokens.move_to_end(token_hash)
+            while len(self._tokens) > self.maxsize:
+                self._tokens.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._tokens),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+token_cache = TokenCache()
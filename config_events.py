@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+import weakref
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from config_manager import ConfigManager, ConfigSnapshot
+
+# How often (seconds) each worker checks data/config.json for writes by the admin service
+CONFIG_WATCH_INTERVAL = float(os.environ.get("CONFIG_WATCH_INTERVAL", "1"))
+# Idle streams get a comment line this often, so proxies keep them open and dead clients are noticed
+CONFIG_STREAM_HEARTBEAT = float(os.environ.get("CONFIG_STREAM_HEARTBEAT", "15"))
+# Open streams per worker; more are refused with 503
+CONFIG_STREAM_MAX_CLIENTS = int(os.environ.get("CONFIG_STREAM_MAX_CLIENTS", "200"))
+# Events a client may fall behind before it is disconnected (it resumes from its last version)
+CLIENT_QUEUE_SIZE = 16
+# Reconnect delay (ms) sent to EventSource clients
+RETRY_MS = 5000
+
+
+def parse_version(value: Optional[str]) -> Optional[int]:
+    """Version from a Last-Event-ID header or ``since`` parameter; None when absent or invalid."""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _json(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def format_event(snapshot: ConfigSnapshot, sections: Dict[str, Optional[bytes]]) -> bytes:
+    """One ``config`` event: the changed sections (null when removed) and every section's version.
+
+    The section bodies are the snapshot's pre-encoded ones, so nothing is serialized twice.
+    """
+    changed = b",".join(_json(name) + b":" + (body if body is not None else b"null") for name, body in sections.items())
+    versions = _json({name: s.version for name, s in snapshot.sections.items()})
+    data = b'{"version":%d,"sections":{%s},"versions":%s}' % (snapshot.version, changed, versions)
+    return b"id: %d\nevent: config\ndata: %s\n\n" % (snapshot.version, data)
+
+
+class ConfigEvents:
+    """Pushes section-level config changes to server-sent event streams.
+
+    A watcher task re-checks the config once per ``watch_interval`` (a stat
+    call, and a reload when it changed, both in a worker thread), so writes
+    by the admin service reach every front worker within about that long and
+    request handlers can read ``ConfigManager.current()`` without touching the file; ``ConfigManager.subscribe`` then reports which sections
+    changed and the event is encoded once and queued for every open stream.
+    Each event carries the config version as its id, so a reconnecting
+    EventSource (``Last-Event-ID``) or a client passing ``since`` gets the
+    sections it missed in one catch-up event. A client that falls
+    ``CLIENT_QUEUE_SIZE`` events behind is disconnected and resumes the same way.
+    """
+
+    def __init__(
+        self,
+        max_clients: int = CONFIG_STREAM_MAX_CLIENTS,
+        heartbeat: float = CONFIG_STREAM_HEARTBEAT,
+        watch_interval: float = CONFIG_WATCH_INTERVAL,
+    ):
+        self.max_clients = max_clients
+        self.heartbeat = heartbeat
+        self.watch_interval = watch_interval
+        self._clients: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._unsubscribe = None
+        self.connections = 0
+        self.rejected = 0
+        self.events = 0
+        self.lagging = 0
+
+    @property
+    def full(self) -> bool:
+        return len(self._clients) >= self.max_clients
+
+    async def start(self) -> None:
+        if self._watch_task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        # Requests read ConfigManager.current(), so have a snapshot before the first one
+        await asyncio.to_thread(ConfigManager.snapshot)
+        self._unsubscribe = ConfigManager.subscribe(self._on_change)
+        self._watch_task = asyncio.create_task(self._watch())
+        self._close_on_signals()
+
+    async def stop(self) -> None:
+        """Stop watching and end every open stream."""
+        if self._watch_task is None:
+            return
+        self._unsubscribe()
+        self._watch_task.cancel()
+        await asyncio.gather(self._watch_task, return_exceptions=True)
+        self._watch_task = None
+        self._close_all()
+
+    def _close_on_signals(self) -> None:
+        """End every stream as soon as the server is told to exit.
+
+        uvicorn waits for open responses before it runs the lifespan shutdown,
+        and event streams never finish on their own. The server's own handler
+        still runs afterwards.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            previous = signal.getsignal(sig)
+            if not callable(previous):
+                continue
+
+            def handler(signum, frame, previous=previous):
+                self._loop.call_soon_threadsafe(self._close_all)
+                previous(signum, frame)
+            signal.signal(sig, handler)
+
+    def _close_all(self) -> None:
+        for queue in list(self._clients):
+            self._close(queue)
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                # A reload parses and compresses the file, so keep it off the event loop
+                await asyncio.to_thread(ConfigManager.snapshot)
+            except Exception as e:
+                print(f"Error checking config for changes: {e}")
+
+    def _on_change(self, changed: Dict[str, Optional[int]], snapshot: ConfigSnapshot) -> None:
+        # Called in whichever thread swapped the snapshot
+        loop = self._loop
+        if loop is None or not self._clients:
+            return
+        sections = {name: snapshot.sections[name].body if version is not None else None for name, version in changed.items()}
+        event = (snapshot.version, format_event(snapshot, sections))
+        try:
+            loop.call_soon_threadsafe(self._broadcast, event)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            pass
+
+    def _broadcast(self, event: Tuple[int, bytes]) -> None:
+        self.events += 1
+        for queue in list(self._clients):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.lagging += 1
+                self._close(queue)
+
+    def _close(self, queue: asyncio.Queue) -> None:
+        self._clients.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def open(self, since: Optional[int] = None) -> Optional[AsyncIterator[bytes]]:
+        """Take a client slot and return its event stream; None (counted as rejected) when all are taken.
+
+        The slot is taken here, when the request arrives, so concurrent
+        requests cannot all pass the check before any stream has started.
+        """
+        if self.full:
+            self.rejected += 1
+            return None
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        # Registered before the catch-up is read, so no change falls in between
+        self._clients.add(queue)
+        self.connections += 1
+        stream = self._stream(queue, since)
+        # A stream dropped before its first iteration (client gone before the headers) never runs its finally
+        weakref.finalize(stream, self._clients.discard, queue)
+        return stream
+
+    async def _stream(self, queue: asyncio.Queue, since: Optional[int]) -> AsyncIterator[bytes]:
+        """Event stream for one client, starting with the sections changed after ``since``."""
+        try:
+            yield b"retry: %d\n\n" % RETRY_MS
+            snapshot = await asyncio.to_thread(ConfigManager.snapshot)
+            if since is None:
+                missed = {}
+            elif since > snapshot.version:
+                # Versions went backwards (config restored or meta removed): resend everything
+                missed = {name: s.body for name, s in snapshot.sections.items()}
+            else:
+                missed = {name: s.body for name, s in snapshot.sections.items() if s.version > since}
+            yield format_event(snapshot, missed)
+            # Events queued while the catch-up was read may already be part of it
+            queued = queue.qsize()
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if item is None:
+                    return
+                version, event = item
+                if queued:
+                    queued -= 1
+                    if version <= snapshot.version:
+                        continue
+                yield event
+        finally:
+            self._clients.discard(queue)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "clients": len(self._clients),
+            "max_clients": self.max_clients,
+            "connections": self.connections,
+            "rejected": self.rejected,
+            "events": self.events,
+            "lagging_disconnects": self.lagging,
+        }
+
+
+config_events = ConfigEvents()
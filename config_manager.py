@@ -1,70 +1,448 @@
+import copy
+import fcntl
+import gzip
+import hashlib
 import json
 import os
-import shutil
-from typing import Any, Dict, List
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from fastapi import HTTPException
 
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
 CONFIG_FILE = "data/config.json"
 SAMPLE_FILE = "data/sample.json"
+# Version counter bumped by every write, plus each section's hash and the version
+# that last changed it, for optimistic concurrency and section ETags
+META_FILE = "data/config.meta.json"
+# flock()ed by every writer (exclusive) and snapshot load (shared), in any process
+LOCK_FILE = "data/config.lock"
 MAX_SKILL_SECTIONS = 10
+# How often (seconds) the cached snapshot re-checks the file on disk
+SNAPSHOT_CHECK_INTERVAL = 1.0
+
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class _EncodedBody:
+    """A JSON body with its strong ETag; gzip and brotli variants are compressed on first use."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.hash = hashlib.sha256(body).hexdigest()
+        self.etag = f'"{self.hash[:32]}"'
+        self._gzip: Optional[bytes] = None
+        self._br: Optional[bytes] = None
+
+    def compress(self) -> None:
+        """Compress every variant now instead of on first use"""
+        self.gzip
+        self.br
+
+    @property
+    def gzip(self) -> bytes:
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.body, compresslevel=9, mtime=0)
+        return self._gzip
+
+    @property
+    def br(self) -> Optional[bytes]:
+        if self._br is None and brotli is not None:
+            self._br = brotli.compress(self.body)
+        return self._br
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header value matches this body's ETag"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return self.etag in tags
+
+    def encode_for(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        """Pick the best encoded body for an Accept-Encoding header"""
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        if brotli is not None and "br" in accepted:
+            return self.br, "br"
+        if "gzip" in accepted:
+            return self.gzip, "gzip"
+        return self.body, None
+
+
+class ConfigSection(_EncodedBody):
+    """One top-level key of the config, with the config version that last changed it."""
+
+    def __init__(self, name: str, data: Any, body: bytes, version: int):
+        super().__init__(body)
+        self.name = name
+        self.data = data
+        self.version = version
+
+
+class ConfigSnapshot(_EncodedBody):
+    """Parsed config plus its pre-encoded JSON body, strong ETag and compressed variants,
+    and the same for each section.
+
+    ``sections_meta`` ({name: {"version", "hash"}}) holds the section versions
+    recorded by the last write; a section whose hash does not match them gets
+    ``version``. Sections unchanged since ``previous`` are reused as they are,
+    compressed variants included.
+    """
+
+    def __init__(
+        self,
+        data: Dict[str, Any],
+        stamp: Optional[Tuple[int, int, int]],
+        version: int = 0,
+        sections_meta: Optional[Dict[str, Dict[str, Any]]] = None,
+        previous: Optional["ConfigSnapshot"] = None,
+    ):
+        sections_meta = sections_meta or {}
+        self.sections: Dict[str, ConfigSection] = {}
+        for name, value in data.items():
+            body = _encode(value)
+            old = previous.sections.get(name) if previous is not None else None
+            if old is not None and old.body == body:
+                self.sections[name] = old
+                continue
+            section = ConfigSection(name, value, body, version)
+            recorded = sections_meta.get(name)
+            if recorded and recorded.get("hash") == section.hash:
+                section.version = recorded.get("version", version)
+            self.sections[name] = section
+        # Same bytes as _encode(data), without encoding every section a second time
+        super().__init__(b"{" + b",".join(_encode(name) + b":" + s.body for name, s in self.sections.items()) + b"}")
+        self.data = data
+        self.stamp = stamp
+        self.version = version
+        # The whole document is requested on every page load, so compress it up front
+        self.compress()
+
+    def changed_since(self, previous: Optional["ConfigSnapshot"]) -> Dict[str, Optional[int]]:
+        """Sections whose content differs from ``previous``: {name: new version, or None if removed}"""
+        if previous is None or previous.etag == self.etag:
+            return {}
+        changed: Dict[str, Optional[int]] = {
+            name: s.version for name, s in self.sections.items()
+            if name not in previous.sections or previous.sections[name].hash != s.hash
+        }
+        changed.update({name: None for name in previous.sections if name not in self.sections})
+        return changed
+
+
+_snapshot: Optional[ConfigSnapshot] = None
+_snapshot_checked = 0.0
+_snapshot_lock = threading.Lock()
+# Set by invalidate(); the stale snapshot is kept to tell subscribers what changed
+_snapshot_stale = False
+_subscribers: List[Callable[[Dict[str, Optional[int]], ConfigSnapshot], None]] = []
+# flock() is per open file, so threads of one process also need a lock of their own
+_write_lock = threading.Lock()
+# One reload at a time per process; taken before the file lock, never by writers
+_reload_lock = threading.Lock()
+
+
+def _file_stamp() -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(CONFIG_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+@contextmanager
+def _file_lock(exclusive: bool):
+    os.makedirs(os.path.dirname(LOCK_FILE), exist_ok=True)
+    with open(LOCK_FILE, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _exclusive():
+    with _write_lock, _file_lock(exclusive=True):
+        yield
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Write a sibling temp file, fsync it and rename it over ``path``: readers see the old or the new file, never a partial one."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _read_meta() -> Dict[str, Any]:
+    try:
+        with open(META_FILE) as f:
+            meta = json.load(f)
+        return {"version": int(meta.get("version", 0)), "sections": dict(meta.get("sections", {}))}
+    except (FileNotFoundError, ValueError, AttributeError, TypeError):
+        return {"version": 0, "sections": {}}
+
+
+def _notify(changed: Dict[str, Optional[int]], snapshot: ConfigSnapshot) -> None:
+    for callback in list(_subscribers):
+        try:
+            callback(changed, snapshot)
+        except Exception as e:
+            print(f"Error notifying config subscriber: {e}")
+
+
+def _publish(snapshot: ConfigSnapshot) -> None:
+    """Swap in a new snapshot (caller holds _snapshot_lock)."""
+    global _snapshot, _snapshot_checked, _snapshot_stale
+    _snapshot = snapshot
+    _snapshot_checked = time.monotonic()
+    _snapshot_stale = False
+
+
+def if_match_version(header: Optional[str]) -> Optional[int]:
+    """Config version from an If-Match header ("7", W/"7"); None when absent."""
+    if not header or header.strip() == "*":
+        return None
+    try:
+        return int(header.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a config version")
+
 
 class ConfigManager:
+    """The one way to read and write data/config.json.
+
+    Readers get an immutable snapshot that is swapped as a whole on change
+    (copy-on-write), addressable by top-level section. Writers hold an exclusive lock across processes, replace
+    the file atomically and bump a version number; passing
+    ``expected_version`` turns a write into a compare-and-swap that fails
+    with 409 if someone else wrote in between. Every section also has a
+    version of its own, the config version that last changed it.
+    """
+
     @staticmethod
-    def read_config() -> Dict[str, Any]:
-        """Read the configuration file"""
+    def snapshot() -> ConfigSnapshot:
+        """Return the cached config snapshot, reloading it if the file changed on disk.
+
+        The returned data is shared between callers and must not be mutated;
+        use read_config() for a private copy.
+        """
+        global _snapshot_checked
+        now = time.monotonic()
+        current = _snapshot
+        if current is not None and not _snapshot_stale and now - _snapshot_checked < SNAPSHOT_CHECK_INTERVAL:
+            return current
+        changed: Dict[str, Optional[int]] = {}
+        # _snapshot_lock is never held while waiting for the file lock: writers
+        # take the file lock first and _snapshot_lock second
+        with _reload_lock:
+            previous = _snapshot
+            stamp = _file_stamp()
+            if previous is None or _snapshot_stale or stamp is None or stamp != previous.stamp:
+                if stamp is None:
+                    ConfigManager._create_from_sample()
+                # Shared lock: the config and its meta are read as one pair
+                with _file_lock(exclusive=False):
+                    meta = _read_meta()
+                    snapshot = ConfigSnapshot(ConfigManager._load_config(), _file_stamp(), meta["version"], meta["sections"], previous)
+                with _snapshot_lock:
+                    # A write from this process may have published a newer snapshot meanwhile
+                    if _snapshot is previous or _snapshot.version <= snapshot.version:
+                        changed = snapshot.changed_since(_snapshot)
+                        _publish(snapshot)
+            with _snapshot_lock:
+                _snapshot_checked = time.monotonic()
+                current = _snapshot
+        if changed:
+            _notify(changed, current)
+        return current
+
+    @staticmethod
+    def current() -> Optional[ConfigSnapshot]:
+        """The snapshot last swapped in, without checking the file; None before the first load.
+
+        For request handlers on the event loop: a background task calls
+        snapshot() to pick up changes, so reading this never blocks.
+        """
+        return _snapshot
+
+    @staticmethod
+    def section(name: str) -> ConfigSection:
+        """One section of the current snapshot (shared, must not be mutated); 404 if missing."""
+        section = ConfigManager.snapshot().sections.get(name)
+        if section is None:
+            raise HTTPException(status_code=404, detail=f"Section {name} not found")
+        return section
+
+    @staticmethod
+    def subscribe(callback: Callable[[Dict[str, Optional[int]], ConfigSnapshot], None]) -> Callable[[], None]:
+        """Call ``callback(changed, snapshot)`` whenever this process swaps in a new snapshot.
+
+        ``changed`` maps each changed section to its new version (None when
+        it was removed). Writes from this process are reported at once,
+        writes from other processes when a read notices the file changed.
+        Callbacks run in the reading or writing thread and must be quick.
+        Returns a function that unsubscribes.
+        """
+        _subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            if callback in _subscribers:
+                _subscribers.remove(callback)
+        return unsubscribe
+
+    @staticmethod
+    def version() -> int:
+        return ConfigManager.snapshot().version
+
+    @staticmethod
+    def invalidate() -> None:
+        """Drop the cached snapshot so the next read goes back to disk"""
+        global _snapshot_stale
+        with _snapshot_lock:
+            _snapshot_stale = True
+
+    @staticmethod
+    def _create_from_sample() -> None:
+        with _exclusive():
+            ConfigManager._ensure_config_locked()
+
+    @staticmethod
+    def _ensure_config_locked() -> None:
+        if os.path.exists(CONFIG_FILE):
+            return
+        if not os.path.exists(SAMPLE_FILE):
+            raise HTTPException(status_code=404, detail="Neither config nor sample file found")
+        with open(SAMPLE_FILE, "rb") as f:
+            atomic_write(CONFIG_FILE, f.read())
+
+    @staticmethod
+    def _load_config() -> Dict[str, Any]:
         try:
-            if not os.path.exists(CONFIG_FILE):
-                # Create config from sample if it exists
-                if os.path.exists(SAMPLE_FILE):
-                    os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-                    shutil.copy2(SAMPLE_FILE, CONFIG_FILE)
-                else:
-                    raise HTTPException(status_code=404, detail="Neither config nor sample file found")
-            
             with open(CONFIG_FILE, 'r') as f:
                 return json.load(f)
+        except HTTPException:
+            raise
         except json.JSONDecodeError:
             raise HTTPException(status_code=500, detail="Invalid config file format")
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
-    
+
     @staticmethod
-    def write_config(config: Dict[str, Any]) -> None:
-        """Write to the configuration file"""
+    def read_config() -> Dict[str, Any]:
+        """Read the configuration (a private copy of the cached snapshot)"""
+        return json.loads(ConfigManager.snapshot().body)
+
+    @staticmethod
+    def _write_locked(config: Dict[str, Any], expected_version: Optional[int], section: Optional[str] = None) -> ConfigSnapshot:
+        """Write under the exclusive lock; returns the new snapshot.
+
+        ``expected_version`` is compared with the version of ``section`` when
+        given, so writers of different sections do not conflict.
+        """
+        meta = _read_meta()
+        current = meta["version"]
+        if section is not None:
+            current = meta["sections"].get(section, {}).get("version", current)
+        if expected_version is not None and expected_version != current:
+            what = f"Section {section}" if section is not None else "Config"
+            raise HTTPException(
+                status_code=409,
+                detail=f"{what} was changed by someone else (version {current}, expected {expected_version}); reload and retry",
+            )
+        version = meta["version"] + 1
+        # The copy keeps the snapshot independent of the caller's dict; sections
+        # whose hash matches the meta keep their version, the others get the new one
+        snapshot = ConfigSnapshot(copy.deepcopy(config), None, version, meta["sections"], _snapshot)
+        sections = {name: {"version": s.version, "hash": s.hash} for name, s in snapshot.sections.items()}
+        atomic_write(CONFIG_FILE, json.dumps(config, indent=4).encode("utf-8"))
+        atomic_write(META_FILE, json.dumps({"version": version, "sections": sections}).encode("utf-8"))
+        snapshot.stamp = _file_stamp()
+        # Publish the new snapshot right away
+        with _snapshot_lock:
+            changed = snapshot.changed_since(_snapshot)
+            _publish(snapshot)
+        if changed:
+            _notify(changed, snapshot)
+        return snapshot
+
+    @staticmethod
+    def write_config(config: Dict[str, Any], expected_version: Optional[int] = None) -> int:
+        """Replace the whole configuration; returns the new version"""
         try:
-            # Ensure the data directory exists
             os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-            
-            # Write the config with pretty formatting
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config, f, indent=4)
+            with _exclusive():
+                return ConfigManager._write_locked(config, expected_version).version
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
-    
+
     @staticmethod
-    def update_config(updates: Dict[str, Any]) -> Dict[str, Any]:
-        """Update specific fields in the config"""
+    def modify(
+        change: Callable[[Dict[str, Any]], Any], expected_version: Optional[int] = None, section: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], int]:
+        """Read-modify-write under the lock, so concurrent writers cannot lose each other's updates.
+
+        ``change`` edits a private copy of the current config in place.
+        Returns the written config and its version, or the version of
+        ``section`` when given (``expected_version`` is then checked against it).
+        """
         try:
-            current_config = ConfigManager.read_config()
-            
-            def deep_update(d: dict, u: dict) -> dict:
-                for k, v in u.items():
-                    if isinstance(v, dict) and k in d and isinstance(d[k], dict):
-                        deep_update(d[k], v)
-                    else:
-                        d[k] = v
-                return d
-            
+            with _exclusive():
+                # Read the file itself (not the snapshot): another process may have written since
+                ConfigManager._ensure_config_locked()
+                config = ConfigManager._load_config()
+                change(config)
+                snapshot = ConfigManager._write_locked(config, expected_version, section)
+                return config, snapshot.sections[section].version if section is not None else snapshot.version
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @staticmethod
+    def update_config(updates: Dict[str, Any], expected_version: Optional[int] = None) -> Tuple[Dict[str, Any], int]:
+        """Update specific fields in the config; returns the written config and the version this write produced"""
+        def deep_update(d: dict, u: dict) -> dict:
+            for k, v in u.items():
+                if isinstance(v, dict) and k in d and isinstance(d[k], dict):
+                    deep_update(d[k], v)
+                else:
+                    d[k] = v
+            return d
+
+        def apply(current_config: Dict[str, Any]) -> None:
             # For skills section, replace it entirely instead of deep update
             if "skills" in updates:
                 current_config["skills"] = updates["skills"]
                 # Validate skills section
                 ConfigManager.validate_skills_section(current_config["skills"])
-            
+
             # For what_im_doing section, replace it entirely
             if "what_im_doing" in updates:
                 current_config["what_im_doing"] = updates["what_im_doing"]
-            
+
             # For other sections, use deep update
             for section in updates:
                 if section not in ["skills", "what_im_doing"]:
@@ -72,21 +450,13 @@ class ConfigManager:
                         deep_update(current_config[section], updates[section])
                     else:
                         current_config[section] = updates[section]
-            
-            # Write back to file
-            ConfigManager.write_config(current_config)
-            
-            return current_config
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
-    
+
+        return ConfigManager.modify(apply, expected_version)
+
     @staticmethod
     def get_section(section: str) -> Dict[str, Any]:
         """Get a specific section of the config"""
-        config = ConfigManager.read_config()
-        if section not in config:
-            raise HTTPException(status_code=404, detail=f"Section {section} not found")
-        return config[section]
+        return ConfigManager.section(section).data
 
     @staticmethod
     def validate_skills_section(skills_data: Dict[str, Any]) -> None:
@@ -141,8 +511,8 @@ class ConfigManager:
     @staticmethod
     def get_skills() -> Dict[str, Any]:
         """Get the skills section of the config"""
-        config = ConfigManager.read_config()
-        return config.get("skills", {"sections": {}})
+        section = ConfigManager.snapshot().sections.get("skills")
+        return section.data if section is not None else {"sections": {}}
 
     @staticmethod
     def update_skills(skills_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -152,31 +522,28 @@ class ConfigManager:
             ConfigManager.validate_skills_section(skills_data)
             
             # Update the config
-            return ConfigManager.update_config({"skills": skills_data})
+            config, _ = ConfigManager.update_config({"skills": skills_data})
+            return config
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
     @staticmethod
     def delete_section(section_id: str) -> Dict[str, Any]:
         """Delete a specific section from the skills configuration"""
-        try:
-            current_config = ConfigManager.read_config()
-            skills_data = current_config.get("skills", {"sections": {}})
-            
-            # Remove the section if it exists
-            if section_id in skills_data["sections"]:
-                del skills_data["sections"][section_id]
-                
-                # Renumber remaining sections to maintain sequential order
-                sections = list(skills_data["sections"].items())
-                skills_data["sections"] = {
-                    f"section_{i+1}": section_data
-                    for i, (_, section_data) in enumerate(sections)
-                }
-                
-                # Update the config
-                return ConfigManager.update_config({"skills": skills_data})
-            
-            return current_config
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        def apply(current_config: Dict[str, Any]) -> None:
+            skills_data = current_config.setdefault("skills", {"sections": {}})
+            skills_data["sections"].pop(section_id, None)
+            # Renumber remaining sections to maintain sequential order
+            sections = list(skills_data["sections"].items())
+            skills_data["sections"] = {
+                f"section_{i+1}": section_data
+                for i, (_, section_data) in enumerate(sections)
+            }
+
+        current_config = ConfigManager.snapshot().data
+        if section_id not in current_config.get("skills", {"sections": {}})["sections"]:
+            return ConfigManager.read_config()
+        config, _ = ConfigManager.modify(apply)
+        return config
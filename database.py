@@ -1,9 +1,82 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
 
 SQLALCHEMY_DATA_URL = 'sqlite:///./data/bonnici_portfolio.db'
-engine = create_engine(SQLALCHEMY_DATA_URL, connect_args={'check_same_thread': False})
+# Same file through aiosqlite, for routes that must not block the event loop
+SQLALCHEMY_ASYNC_DATA_URL = 'sqlite+aiosqlite:///./data/bonnici_portfolio.db'
+
+# Applied to every new connection; each can be overridden with SQLITE_<NAME>.
+# Front workers and the admin service share this file: WAL lets reads run
+# alongside the single writer, busy_timeout makes writers queue instead of
+# failing, and synchronous=NORMAL is durable in WAL mode except on power loss.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", "5000")),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative values are KiB: 64 MiB of page cache per connection
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", "-65536")),
+    "temp_store": os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+}
+# Request threads, the visit/location workers and the outbox each hold a
+# connection briefly; WAL readers run in parallel, writers take turns
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "8"))
+SQLITE_MAX_OVERFLOW = int(os.environ.get("SQLITE_MAX_OVERFLOW", "8"))
+SQLITE_POOL_TIMEOUT = int(os.environ.get("SQLITE_POOL_TIMEOUT", "30"))
+
+
+def _engine_options(pragmas: dict, kwargs: dict) -> dict:
+    settings = {**SQLITE_PRAGMAS, **(pragmas or {})}
+    if "poolclass" not in kwargs:
+        kwargs.setdefault("pool_size", SQLITE_POOL_SIZE)
+        kwargs.setdefault("max_overflow", SQLITE_MAX_OVERFLOW)
+        kwargs.setdefault("pool_timeout", SQLITE_POOL_TIMEOUT)
+    kwargs["connect_args"] = {"check_same_thread": False, "timeout": settings["busy_timeout"] / 1000}
+    return settings
+
+
+def _listen_for_pragmas(sync_engine, settings: dict) -> None:
+    @event.listens_for(sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in settings.items():
+            if value is not None:
+                cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_sqlite_engine(url: str = SQLALCHEMY_DATA_URL, pragmas: dict = None, **kwargs):
+    """Engine that applies SQLITE_PRAGMAS (updated with ``pragmas``) on connect.
+
+    Extra keyword arguments go to ``create_engine``; the QueuePool is sized
+    from SQLITE_POOL_SIZE / SQLITE_MAX_OVERFLOW unless a poolclass is given.
+    """
+    settings = _engine_options(pragmas, kwargs)
+    sqlite_engine = create_engine(url, **kwargs)
+    _listen_for_pragmas(sqlite_engine, settings)
+    return sqlite_engine
+
+
+def create_async_sqlite_engine(url: str = SQLALCHEMY_ASYNC_DATA_URL, pragmas: dict = None, **kwargs):
+    """aiosqlite counterpart of ``create_sqlite_engine``, with the same pragmas and pool sizing.
+
+    Each connection runs in its own aiosqlite thread, so queries awaited on it
+    leave the event loop free while SQLite works.
+    """
+    settings = _engine_options(pragmas, kwargs)
+    async_engine = create_async_engine(url, **kwargs)
+    _listen_for_pragmas(async_engine.sync_engine, settings)
+    return async_engine
+
+
+engine = create_sqlite_engine()
 SessionLocal = sessionmaker(autocommit=False,autoflush=False,bind=engine)
-Base = declarative_base()
\ No newline at end of file
+async_engine = create_async_sqlite_engine()
+# Attributes stay loaded after commit: lazy loads are not possible outside an await
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+Base = declarative_base()
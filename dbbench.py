@@ -0,0 +1,212 @@
+"""SQLite throughput under concurrent front (writer) and admin (reader) load.
+
+    python dbbench.py --writers 2 --readers 2 --duration 10
+    python dbbench.py --event-loop --concurrency 16 --duration 10
+
+Runs each pragma profile against a fresh temporary database. Writer processes
+log visits the way the front service does (Entry + rollups, ``--batch`` visits
+per commit, as the write-behind buffer flushes them); reader processes run the admin dashboard queries (first visitors
+page and rollup totals).
+
+``--event-loop`` instead runs the dashboard queries from ``--concurrency``
+coroutines in one event loop, once with the blocking ``Session`` and once with
+the aiosqlite ``AsyncSession`` the HTTP routes use, and reports how late a
+10 ms timer fires meanwhile: the delay every other request on that worker sees.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, SQLITE_PRAGMAS, create_async_sqlite_engine, create_sqlite_engine
+from models import Entry
+import rollups
+
+PROFILES = {
+    # SQLite's own defaults: rollback journal, fsync on every commit, no mmap, 2 MB cache
+    "defaults": {"journal_mode": "DELETE", "synchronous": "FULL", "mmap_size": 0, "cache_size": -2000, "temp_store": "DEFAULT"},
+    "tuned": dict(SQLITE_PRAGMAS),
+}
+# Timer used by --event-loop to measure how long the loop is blocked
+LAG_PROBE_INTERVAL = 0.01
+
+
+def _session(url, pragmas):
+    return sessionmaker(bind=create_sqlite_engine(url, pragmas=pragmas))()
+
+
+def _percentiles(samples):
+    lat = sorted(samples)
+    return {
+        "p50_ms": lat[len(lat) // 2] * 1000 if lat else 0.0,
+        "p99_ms": lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000 if lat else 0.0,
+        "max_ms": lat[-1] * 1000 if lat else 0.0,
+    }
+
+
+def _seed(url, pragmas, seed_rows):
+    engine = create_sqlite_engine(url, pragmas=pragmas)
+    Base.metadata.create_all(bind=engine)
+    seed = sessionmaker(bind=engine)()
+    for i in range(seed_rows):
+        seed.add(Entry(ip_address=f"192.168.{i % 250}.1", created=datetime.now(), user_agent="seed", is_bot=False))
+    seed.commit()
+    seed.close()
+    engine.dispose()
+
+
+def _wait_until(start_at):
+    time.sleep(max(0.0, start_at - time.monotonic()))
+
+
+def _writer(url, pragmas, batch, start_at, deadline, results):
+    db = _session(url, pragmas)
+    _wait_until(start_at)
+    latencies, errors, n = [], 0, 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            now = datetime.now()
+            rows = [
+                {"id": uuid.uuid4(), "ip_address": f"10.{(n + i) // 250 % 250}.{(n + i) % 250}.{os.getpid() % 250}", "created": now,
+                 "user_agent": "bench", "is_bot": False, "device_family": "Other", "browser_family": "Firefox", "country": "Bench"}
+                for i in range(batch)
+            ]
+            db.execute(insert(Entry), rows)
+            rollups.record_visits(db, ((now, row["ip_address"], rollups.visit_dimensions("Other", "Firefox", "Bench")) for row in rows))
+            db.commit()
+            # One latency sample per visit, so ops/s counts visits whatever the batch size
+            latencies.extend([time.perf_counter() - start] * batch)
+        except Exception:
+            db.rollback()
+            errors += 1
+        n += batch
+    results.put(("write", latencies, errors))
+
+
+def _reader(url, pragmas, start_at, deadline, results):
+    db = _session(url, pragmas)
+    _wait_until(start_at)
+    latencies, errors = [], 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            db.query(Entry).order_by(Entry.created.desc(), Entry.id.desc()).limit(200).all()
+            rollups.summary(db)
+            rollups.summary(db, since=datetime.now())
+            db.rollback()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            db.rollback()
+            errors += 1
+    results.put(("read", latencies, errors))
+
+
+def run(profile: str, writers: int, readers: int, duration: float, seed_rows: int, batch: int = 1) -> dict:
+    pragmas = PROFILES[profile]
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        _seed(url, pragmas, seed_rows)
+
+        results = multiprocessing.Queue()
+        # All processes start together once they have connected
+        start_at = time.monotonic() + 1.0
+        deadline = start_at + duration
+        procs = [multiprocessing.Process(target=_writer, args=(url, pragmas, batch, start_at, deadline, results)) for _ in range(writers)]
+        procs += [multiprocessing.Process(target=_reader, args=(url, pragmas, start_at, deadline, results)) for _ in range(readers)]
+        for p in procs:
+            p.start()
+        collected = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+    summary = {}
+    for kind in ("write", "read"):
+        lat = [x for k, l, _ in collected if k == kind for x in l]
+        errors = sum(e for k, _, e in collected if k == kind)
+        summary[kind] = {"ops_per_s": len(lat) / duration, **_percentiles(lat), "errors": errors}
+    return summary
+
+
+async def _event_loop_clients(mode, url, pragmas, concurrency, duration):
+    if mode == "async":
+        engine = create_async_sqlite_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1), pragmas=pragmas)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+    else:
+        engine = create_sqlite_engine(url, pragmas=pragmas)
+        sessions = sessionmaker(bind=engine)
+    deadline = time.monotonic() + duration
+    latencies, lags = [], []
+    latest = select(Entry).order_by(Entry.created.desc(), Entry.id.desc()).limit(200)
+
+    async def client():
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            if mode == "async":
+                async with sessions() as db:
+                    (await db.execute(latest)).scalars().all()
+                    await db.run_sync(rollups.summary)
+            else:
+                # What a route did before it had an AsyncSession: the loop waits for SQLite
+                with sessions() as db:
+                    db.execute(latest).scalars().all()
+                    rollups.summary(db)
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0)
+
+    async def probe():
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            lags.append(time.perf_counter() - start - LAG_PROBE_INTERVAL)
+
+    await asyncio.gather(probe(), *(client() for _ in range(concurrency)))
+    if mode == "async":
+        await engine.dispose()
+    else:
+        engine.dispose()
+    return {"ops_per_s": len(latencies) / duration, **_percentiles(latencies), "lag": _percentiles(lags)}
+
+
+def run_event_loop(mode: str, concurrency: int, duration: float, seed_rows: int) -> dict:
+    """Dashboard queries from ``concurrency`` coroutines with a blocking ("blocking") or aiosqlite ("async") session."""
+    pragmas = PROFILES["tuned"]
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        _seed(url, pragmas, seed_rows)
+        return asyncio.run(_event_loop_clients(mode, url, pragmas, concurrency, duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--seed-rows", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=1, help="Visits per write transaction")
+    parser.add_argument("--profile", choices=sorted(PROFILES), action="append")
+    parser.add_argument("--event-loop", action="store_true", help="Compare blocking and aiosqlite sessions inside one event loop")
+    parser.add_argument("--concurrency", type=int, default=16, help="Coroutines issuing queries with --event-loop")
+    args = parser.parse_args()
+    if args.event_loop:
+        for mode in ("blocking", "async"):
+            r = run_event_loop(mode, args.concurrency, args.duration, args.seed_rows)
+            print(f"{mode:9} read  {r['ops_per_s']:8.0f} ops/s  p50 {r['p50_ms']:6.2f} ms  p99 {r['p99_ms']:7.2f} ms  "
+                  f"loop lag p99 {r['lag']['p99_ms']:7.2f} ms  max {r['lag']['max_ms']:7.2f} ms")
+        return
+    for profile in args.profile or list(PROFILES):
+        result = run(profile, args.writers, args.readers, args.duration, args.seed_rows, args.batch)
+        for kind, r in result.items():
+            print(f"{profile:9} {kind:5} {r['ops_per_s']:8.0f} ops/s  p50 {r['p50_ms']:6.2f} ms  p99 {r['p99_ms']:7.2f} ms  errors {r['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import json
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.sqlite import insert
+
+from database import SessionLocal
+from models import DeviceInfo
+
+# Device info waits at most this long for the visit it belongs to
+TTL = timedelta(minutes=10)
+# Largest accepted /api/device-info body; the SPA sends well under 1 KB
+MAX_ENTRY_BYTES = 4096
+# Rows kept at most (≈ MAX_ENTRIES * MAX_ENTRY_BYTES of storage); the oldest go first
+MAX_ENTRIES = 10000
+# Expired rows and the cap are enforced every this many writes
+PRUNE_EVERY = 100
+
+SESSION_HEADER = "x-session-id"
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+_writes = 0
+
+
+class EntryTooLarge(ValueError):
+    pass
+
+
+def session_key(session_id: Optional[str], ip_address: Optional[str]) -> Optional[str]:
+    """Correlation key for a client: its session ID, or its IP for clients that send none."""
+    if session_id and _SESSION_ID.match(session_id):
+        return session_id
+    return f"ip:{ip_address}" if ip_address else None
+
+
+def put(key: str, info: Dict[str, Any]) -> None:
+    """Store (or replace) the device info for a session; shared by every worker process."""
+    global _writes
+    payload = json.dumps(info, separators=(",", ":"))
+    if len(payload) > MAX_ENTRY_BYTES:
+        raise EntryTooLarge(f"Device info exceeds {MAX_ENTRY_BYTES} bytes")
+    now = datetime.now()
+    stmt = insert(DeviceInfo).values(session_id=key, payload=payload, created=now, expires=now + TTL)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["session_id"],
+        set_={"payload": stmt.excluded.payload, "created": stmt.excluded.created, "expires": stmt.excluded.expires},
+    )
+    db = SessionLocal()
+    try:
+        db.execute(stmt)
+        _writes += 1
+        if _writes % PRUNE_EVERY == 0:
+            prune(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def take_many(db, keys: Iterable[Optional[str]]) -> Dict[str, Dict[str, Any]]:
+    """Remove and return the live device info of several sessions in the caller's transaction."""
+    keys = list({key for key in keys if key})
+    found: Dict[str, Dict[str, Any]] = {}
+    stmt = text(
+        "DELETE FROM device_infos WHERE session_id IN :keys RETURNING session_id, payload, expires"
+    ).bindparams(bindparam("keys", expanding=True))
+    # Stay well under SQLite's bound-parameter limit
+    for i in range(0, len(keys), 500):
+        for row in db.execute(stmt, {"keys": keys[i:i + 500]}):
+            info = _decode(row)
+            if info is not None:
+                found[row.session_id] = info
+    return found
+
+
+def _decode(row) -> Optional[Dict[str, Any]]:
+    expires = row.expires if isinstance(row.expires, datetime) else datetime.fromisoformat(row.expires)
+    if expires <= datetime.now():
+        return None
+    try:
+        return json.loads(row.payload)
+    except ValueError:
+        return None
+
+
+def prune(db) -> None:
+    """Drop expired rows, then the oldest rows beyond MAX_ENTRIES (caller commits)."""
+    db.query(DeviceInfo).filter(DeviceInfo.expires <= datetime.now()).delete(synchronize_session=False)
+    db.execute(
+        text(
+            "DELETE FROM device_infos WHERE session_id IN ("
+            "SELECT session_id FROM device_infos ORDER BY created DESC LIMIT -1 OFFSET :cap)"
+        ),
+        {"cap": MAX_ENTRIES},
+    )
@@ -0,0 +1,168 @@
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# Seconds to collect visits into one digest notification; 0 sends one notification per visit
+VISITOR_DIGEST_WINDOW = int(os.environ.get("VISITOR_DIGEST_WINDOW", "0"))
+# A digest goes out early once it holds this many visits
+VISITOR_DIGEST_MAX_VISITS = int(os.environ.get("VISITOR_DIGEST_MAX_VISITS", "100"))
+# Seconds during which further visits from the same IP do not notify again; 0 disables
+VISITOR_DEDUPE_WINDOW = int(os.environ.get("VISITOR_DEDUPE_WINDOW", "0"))
+# Top values listed per breakdown in a digest
+DIGEST_TOP = 5
+
+
+class VisitDigest:
+    """Collects visitor notifications in memory and hands them out as one summary.
+
+    Called from the visit worker threads, so every method takes the lock. Only
+    counts are held here; the visits themselves are already committed, so a
+    crash loses at most one pending summary, never data. ``begin()`` stages
+    the changes for one transaction so they are only applied once it commits.
+    """
+
+    def __init__(self, window: int = VISITOR_DIGEST_WINDOW, max_visits: int = VISITOR_DIGEST_MAX_VISITS, dedupe_window: int = VISITOR_DEDUPE_WINDOW):
+        self.window = window
+        self.max_visits = max_visits
+        self.dedupe_window = timedelta(seconds=dedupe_window)
+        self._lock = threading.Lock()
+        self._last_seen: Dict[str, datetime] = {}
+        self._reset()
+        self.repeats_skipped = 0
+        self.digests = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _reset(self) -> None:
+        self._started: Optional[datetime] = None
+        self._visits = 0
+        self._ips = set()
+        self._countries: Counter = Counter()
+        self._devices: Counter = Counter()
+        self._browsers: Counter = Counter()
+        self._repeats = 0
+
+    def begin(self) -> "DigestUpdate":
+        """Stage ``is_repeat``/``add`` calls; nothing changes until ``commit()`` on the result."""
+        return DigestUpdate(self)
+
+    def is_repeat(self, ip_address: Optional[str], now: Optional[datetime] = None) -> bool:
+        """True if this IP already notified within the dedupe window (and counts it)."""
+        update = self.begin()
+        repeat = update.is_repeat(ip_address, now)
+        update.commit()
+        return repeat
+
+    def add(self, ip_address: Optional[str], country: Optional[str], device: Optional[str], browser: Optional[str], now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Count one visit; returns the finished summary if this visit filled the digest."""
+        update = self.begin()
+        update.add(ip_address, country, device, browser, now)
+        summaries = update.commit()
+        return summaries[0] if summaries else None
+
+    def last_seen(self, ip_address: str) -> Optional[datetime]:
+        with self._lock:
+            return self._last_seen.get(ip_address)
+
+    def _apply(self, seen: Dict[str, datetime], repeats: int, visits: List[Tuple]) -> List[Dict[str, Any]]:
+        summaries = []
+        with self._lock:
+            for ip_address, country, device, browser, now in visits:
+                if self._started is None:
+                    self._started = now
+                self._visits += 1
+                if ip_address:
+                    self._ips.add(ip_address)
+                self._countries[country or "Unknown"] += 1
+                self._devices[device or "Other"] += 1
+                self._browsers[browser or "Other"] += 1
+                if self._visits >= self.max_visits:
+                    summaries.append(self._take(now))
+            self.repeats_skipped += repeats
+            if self._started is not None:
+                self._repeats += repeats
+            if seen:
+                self._last_seen.update(seen)
+                if len(self._last_seen) > 10000:
+                    cutoff = max(seen.values()) - self.dedupe_window
+                    self._last_seen = {ip: ts for ip, ts in self._last_seen.items() if ts >= cutoff}
+        return summaries
+
+    def take_due(self, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Return the summary once ``window`` seconds have passed since its first visit."""
+        now = now or datetime.now()
+        with self._lock:
+            if self._started is None or now - self._started < timedelta(seconds=self.window):
+                return None
+            return self._take(now)
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        """Return whatever has been collected, regardless of the window."""
+        with self._lock:
+            return self._take(datetime.now()) if self._started is not None else None
+
+    def _take(self, now: datetime) -> Dict[str, Any]:
+        summary = {
+            "start": self._started.isoformat(),
+            "end": now.isoformat(),
+            "visits": self._visits,
+            "unique_ips": len(self._ips),
+            "repeat_visits": self._repeats,
+            "countries": dict(self._countries.most_common(DIGEST_TOP)),
+            "devices": dict(self._devices.most_common(DIGEST_TOP)),
+            "browsers": dict(self._browsers.most_common(DIGEST_TOP)),
+        }
+        self._reset()
+        self.digests += 1
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "window_seconds": self.window,
+                "max_visits": self.max_visits,
+                "dedupe_seconds": int(self.dedupe_window.total_seconds()),
+                "pending_visits": self._visits,
+                "digests_sent": self.digests,
+                "repeats_skipped": self.repeats_skipped,
+            }
+
+
+class DigestUpdate:
+    """The digest changes of one transaction, applied by ``commit()`` once it has committed.
+
+    A batch that fails and is retried is then neither counted twice nor
+    taken for a repeat of itself.
+    """
+
+    def __init__(self, digest: VisitDigest):
+        self.digest = digest
+        self._seen: Dict[str, datetime] = {}
+        self._repeats = 0
+        self._visits: List[Tuple] = []
+
+    def is_repeat(self, ip_address: Optional[str], now: Optional[datetime] = None) -> bool:
+        """Like ``VisitDigest.is_repeat``, also counting the visits staged here."""
+        if not self.digest.dedupe_window or not ip_address:
+            return False
+        now = now or datetime.now()
+        last = self._seen.get(ip_address) or self.digest.last_seen(ip_address)
+        if last is not None and now - last < self.digest.dedupe_window:
+            self._repeats += 1
+            return True
+        self._seen[ip_address] = now
+        return False
+
+    def add(self, ip_address: Optional[str], country: Optional[str], device: Optional[str], browser: Optional[str], now: Optional[datetime] = None) -> None:
+        self._visits.append((ip_address, country, device, browser, now or datetime.now()))
+
+    def commit(self) -> List[Dict[str, Any]]:
+        """Apply the staged changes; returns the summaries they filled (usually none)."""
+        summaries = self.digest._apply(self._seen, self._repeats, self._visits)
+        self._seen, self._repeats, self._visits = {}, 0, []
+        return summaries
@@ -0,0 +1,110 @@
+import asyncio
+import inspect
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class Dispatcher:
+    """Bounded in-process queue drained by background worker tasks.
+
+    Jobs are handed to ``handler`` in a worker thread so blocking work (HTTP
+    calls, SQLite commits) never runs on the event loop; coroutine handlers are
+    awaited directly and must offload their own blocking work. When the queue is full
+    the oldest pending job is dropped to make room for the newest one.
+    """
+
+    def __init__(self, handler: Callable[[Any], None], name: str, maxsize: int = 1000, workers: int = 2):
+        self.handler = handler
+        self.name = name
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue: deque = deque()
+        self._ready: Optional[asyncio.Event] = None
+        self._tasks: list[asyncio.Task] = []
+        self._running = False
+        # Jobs taken off the queue whose handler has not returned yet
+        self._in_flight = 0
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def submit(self, job: Any) -> bool:
+        """Queue a job without blocking. Returns False if an older job was dropped."""
+        accepted = True
+        if len(self._queue) >= self.maxsize:
+            self._queue.popleft()
+            self.dropped += 1
+            accepted = False
+        self._queue.append((time.monotonic(), job))
+        self.submitted += 1
+        if self._ready is not None:
+            self._ready.set()
+        return accepted
+
+    async def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._ready = asyncio.Event()
+        if self._queue:
+            self._ready.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Drain what is left in the queue (up to ``timeout`` seconds) and stop the workers.
+
+        Jobs already taken by a worker are waited for as well, so only workers
+        that are idle (or past the deadline) are cancelled.
+        """
+        deadline = time.monotonic() + timeout
+        while (self._queue or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            enqueued, job = self._queue.popleft()
+            lag = time.monotonic() - enqueued
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self._in_flight += 1
+            try:
+                if inspect.iscoroutinefunction(self.handler):
+                    await self.handler(job)
+                else:
+                    await asyncio.to_thread(self.handler, job)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Error in {self.name} worker: {e}")
+            finally:
+                self._in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        oldest = self._queue[0][0] if self._queue else None
+        return {
+            "depth": len(self._queue),
+            "in_flight": self._in_flight,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "running": self._running,
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "lag_seconds": round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+            "last_lag_seconds": round(self.last_lag, 3),
+            "max_lag_seconds": round(self.max_lag, 3),
+        }
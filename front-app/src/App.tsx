@@ -1,5 +1,6 @@
 import { useEffect } from 'react'
 import { useConfig } from '@/hooks/useConfig'
+import { sessionId } from '@/lib/session'
 import { Hero } from '@/components/sections/Hero'
 import { About } from '@/components/sections/About'
 import { Doing } from '@/components/sections/Doing'
@@ -52,7 +53,7 @@ export default function App() {
   useEffect(() => {
     fetch('/api/device-info', {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', 'X-Session-Id': sessionId() },
       body: JSON.stringify({
         screen_width: screen.width,
         screen_height: screen.height,
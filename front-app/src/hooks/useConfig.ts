@@ -1,14 +1,94 @@
-import { useQuery } from '@tanstack/react-query'
+import { useEffect } from 'react'
+import { useQuery, useQueryClient } from '@tanstack/react-query'
 import type { Config } from '@/types/config'
+import { sessionId } from '@/lib/session'
+
+// One event per config change: the changed sections (null when removed)
+interface ConfigEvent {
+  version: number
+  sections: Record<string, unknown>
+  versions: Record<string, number>
+}
+
+interface InlinedConfig {
+  config: Config
+  version: string | null
+  etag: string | null
+}
+
+// Config inlined into index.html by publish.py, if the page was published
+function readInlinedConfig(): InlinedConfig | undefined {
+  const el = document.getElementById('portfolio-config')
+  if (!el?.textContent) return undefined
+  try {
+    return { config: JSON.parse(el.textContent), version: el.dataset.version ?? null, etag: el.dataset.etag ?? null }
+  } catch {
+    return undefined
+  }
+}
+
+const inlined = readInlinedConfig()
+let revalidated = false
+
+// Version the loaded config was read at, so the stream can send what changed since
+let loadedVersion: string | null = inlined?.version ?? null
+
+// Resolves to null when the server answers 304 (the config matches `etag`)
+async function fetchConfig(etag?: string | null): Promise<Config | null> {
+  const headers: Record<string, string> = { 'X-Session-Id': sessionId() }
+  if (etag) headers['If-None-Match'] = etag
+  const res = await fetch('/api/config', { headers })
+  if (res.status === 304) return null
+  if (!res.ok) throw new Error('Failed to load config')
+  loadedVersion = res.headers.get('X-Config-Version')
+  return res.json()
+}
 
 export function useConfig() {
-  return useQuery<Config>({
+  const queryClient = useQueryClient()
+  const query = useQuery<Config>({
     queryKey: ['config'],
-    queryFn: async () => {
-      const res = await fetch('/api/config')
-      if (!res.ok) throw new Error('Failed to load config')
-      return res.json()
-    },
+    queryFn: async () => (await fetchConfig()) as Config,
+    initialData: inlined?.config,
     staleTime: Infinity,
   })
+  const loaded = query.isSuccess
+
+  // The page rendered from the inlined config; still ask the API once, as a
+  // conditional request that is normally a bodiless 304, so the visit is
+  // logged and a page published before the latest save is corrected
+  useEffect(() => {
+    if (!inlined || revalidated) return
+    revalidated = true
+    fetchConfig(inlined.etag)
+      .then(config => {
+        if (config) queryClient.setQueryData(['config'], config)
+      })
+      .catch(() => {})
+  }, [queryClient])
+
+  // Live updates: the server pushes only the sections that changed, and
+  // EventSource resumes from the last event id after a reconnect
+  useEffect(() => {
+    if (!loaded || typeof EventSource === 'undefined') return
+    const since = loadedVersion ? `?since=${encodeURIComponent(loadedVersion)}` : ''
+    const source = new EventSource(`/api/config/stream${since}`)
+    source.addEventListener('config', e => {
+      const event: ConfigEvent = JSON.parse((e as MessageEvent<string>).data)
+      const names = Object.keys(event.sections)
+      if (!names.length) return
+      queryClient.setQueryData<Config>(['config'], old => {
+        if (!old) return old
+        const next: Record<string, unknown> = { ...old }
+        for (const name of names) {
+          if (event.sections[name] === null) delete next[name]
+          else next[name] = event.sections[name]
+        }
+        return next as unknown as Config
+      })
+    })
+    return () => source.close()
+  }, [loaded, queryClient])
+
+  return query
 }
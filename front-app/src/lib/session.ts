@@ -0,0 +1,24 @@
+const STORAGE_KEY = 'portfolio-session-id'
+
+let fallbackId: string | null = null
+
+function newId(): string {
+  if (typeof crypto !== 'undefined' && 'randomUUID' in crypto) return crypto.randomUUID()
+  return Array.from({ length: 32 }, () => Math.floor(Math.random() * 16).toString(16)).join('')
+}
+
+// Per-tab ID sent as X-Session-Id so the server can match the /api/config
+// visit with the /api/device-info post from the same page load
+export function sessionId(): string {
+  try {
+    let id = sessionStorage.getItem(STORAGE_KEY)
+    if (!id) {
+      id = newId()
+      sessionStorage.setItem(STORAGE_KEY, id)
+    }
+    return id
+  } catch {
+    fallbackId ??= newId()
+    return fallbackId
+  }
+}
@@ -1,20 +1,50 @@
+import asyncio
 import os
 import sys
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
 
 from .routes import home
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import engine
-import models
+import migrations
+import webhook_client
+from database import async_engine
+from publish import FRONT_APP_DIST, PUBLISH_DIR, publisher
+from static_files import IMMUTABLE, REVALIDATE, CachedStaticFiles, precompress
 
-app = FastAPI(title="Portfolio Website", version="0.5.0")
+# Uploaded images keep their name when replaced, so visitors may see an old one this long
+DATA_CACHE_CONTROL = "public, max-age=300"
 
-models.Base.metadata.create_all(bind=engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.path.isdir(FRONT_APP_DIST):
+        await asyncio.to_thread(precompress, FRONT_APP_DIST)
+    await home.visit_buffer.start()
+    await home.location_dispatcher.start()
+    await home.outbox_worker.start()
+    await home.config_events.start()
+    await publisher.start()
+    digest_task = asyncio.create_task(home.flush_visitor_digest_periodically()) if home.visitor_digest.enabled else None
+    yield
+    await publisher.stop()
+    await home.config_events.stop()
+    await home.visit_buffer.stop()
+    await home.location_dispatcher.stop()
+    if digest_task:
+        digest_task.cancel()
+        await home.flush_visitor_digest(force=True)
+    await home.outbox_worker.stop()
+    webhook_client.close()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Portfolio Website", version="0.5.0", lifespan=lifespan)
+
+migrations.upgrade()
 
 # CORS — only needed for local Vite dev server (Vite proxy handles prod)
 app.add_middleware(
@@ -26,21 +56,24 @@ app.add_middleware(
 )
 
 # Mount shared data directory (images, etc.)
-app.mount("/data", StaticFiles(directory="data"), name="data")
+app.mount("/data", CachedStaticFiles(directory="data", cache_control=DATA_CACHE_CONTROL, precompressed=False), name="data")
+# Content-hashed config artifacts written by publish.py
+app.mount("/published", CachedStaticFiles(directory=PUBLISH_DIR, cache_control=IMMUTABLE, check_dir=False), name="published")
 
 # API routes
 app.include_router(home.router)
 
 # Serve React build for everything else (SPA fallback)
-FRONT_APP_DIST = "front-app/dist"
-
 if os.path.isdir(FRONT_APP_DIST):
-    app.mount("/assets", StaticFiles(directory=f"{FRONT_APP_DIST}/assets"), name="front-assets")
+    # Vite puts a content hash in every asset name
+    app.mount("/assets", CachedStaticFiles(directory=f"{FRONT_APP_DIST}/assets", cache_control=IMMUTABLE), name="front-assets")
+    # index.html has the config inlined by publish.py, so it is revalidated on every load
+    dist_files = CachedStaticFiles(directory=FRONT_APP_DIST, cache_control=REVALIDATE)
 
     @app.get("/{full_path:path}")
-    async def spa_fallback(full_path: str):
-        # Serve static files that exist (e.g. favicon.ico, icons.svg)
-        file_path = os.path.join(FRONT_APP_DIST, full_path)
-        if full_path and os.path.isfile(file_path):
-            return FileResponse(file_path)
-        return FileResponse(f"{FRONT_APP_DIST}/index.html")
+    async def spa_fallback(full_path: str, request: Request):
+        # Files of the build (favicon.ico, icons.svg) are looked up in the in-memory manifest, which
+        # also holds index.html itself, so client-side routes are answered without touching the disk
+        listing = await dist_files.manifest.listing()
+        path = full_path if full_path and full_path in listing.files else "index.html"
+        return await dist_files.get_response(path, request.scope)
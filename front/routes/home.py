@@ -1,307 +1,332 @@
+import asyncio
+import json
 import os
 import sys
-import requests
-import json
+import uuid
 from datetime import datetime
-from typing import Annotated, Dict, Any, List
+from typing import Dict, Any, List, Optional
 
-import user_agents
-
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from database import SessionLocal
+from database import AsyncSessionLocal, SessionLocal
 from models import ContactMessage, Entry, Webhook
-from config_manager import ConfigManager
-
-# Global variable to store device info temporarily
-device_info_cache = {}
+from config_manager import ConfigManager, ConfigSnapshot
+from config_events import config_events, parse_version
+from publish import publisher
+from digest import VisitDigest
+from dispatch import Dispatcher
+from outbox import OutboxWorker
+from write_behind import WriteBehind
+import device_store
+import geolocation
+import outbox
+import rollups
+import visits
+import webhook_payloads
+
+# Visits are buffered and written in batches (see "Visit Logging" in the README)
+VISIT_BUFFER_SIZE = int(os.environ.get("VISIT_BUFFER_SIZE", "10000"))
+VISIT_FLUSH_ROWS = int(os.environ.get("VISIT_FLUSH_ROWS", "500"))
+VISIT_FLUSH_INTERVAL_MS = int(os.environ.get("VISIT_FLUSH_INTERVAL_MS", "250"))
+# "memory" or "spool"; what a crash can lose is described in write_behind.py
+VISIT_DURABILITY = os.environ.get("VISIT_DURABILITY", "memory")
+# Outside data/, which is served publicly at /data: spooled visits hold IP addresses
+VISIT_SPOOL_DIR = os.environ.get("VISIT_SPOOL_DIR", "spool")
+LOCATION_QUEUE_SIZE = 1000
+# How often the visitor digest window is checked
+DIGEST_CHECK_INTERVAL = 1.0
 
 
 def get_webhooks_by_type(db: Session, webhook_type: str) -> List[Webhook]:
     return db.query(Webhook).filter(Webhook.name == webhook_type).all()
 
 
-def detect_webhook_platform(url: str) -> str:
-    url_lower = url.lower()
-    if "discord.com/api/webhooks" in url_lower:
-        return "discord"
-    elif "hooks.slack.com" in url_lower:
-        return "slack"
-    elif "webhook.office.com" in url_lower or "office365.com" in url_lower:
-        return "teams"
-    return "generic"
+def message_context(contact_message: ContactMessage) -> Dict[str, Any]:
+    return {
+        "name": contact_message.fullname,
+        "email": contact_message.email,
+        "subject": contact_message.subject,
+        "message": contact_message.message,
+        "ip_address": contact_message.ip_address,
+        # Stored by fill_location just before rendering; no second lookup
+        "location": geolocation.row_location(contact_message),
+        "timestamp": contact_message.created,
+    }
 
 
-def get_ip_info(ip_address: str):
-    if ip_address == "127.0.0.1":
-        ip_address = "8.8.8.8"
-    try:
-        response = requests.get(f"http://ip-api.com/json/{ip_address}", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data["status"] == "success":
-                return {
-                    "country": data["country"],
-                    "city": data["city"],
-                    "region": data["regionName"],
-                    "lat": data["lat"],
-                    "lon": data["lon"],
-                }
-    except Exception as e:
-        print(f"Error getting IP info: {e}")
-    return None
-
-
-def format_device_info(user_agent_str: str, device_info: Dict[Any, Any] = None) -> tuple:
-    ua = user_agents.parse(user_agent_str)
-    device_str = f"📱 Device: {ua.device.family}"
-    if ua.device.brand and ua.device.model:
-        device_str += f" ({ua.device.brand} {ua.device.model})"
-    os_str = f"💻 OS: {ua.os.family} {ua.os.version_string}"
-    browser_str = f"🌐 Browser: {ua.browser.family} {ua.browser.version_string}"
-
-    resolution_parts = []
-    if device_info and "screen" in device_info:
-        screen = device_info["screen"]
-        viewport = device_info.get("viewport", {})
-        if screen.get("width") and screen.get("height"):
-            resolution_parts.append(f"📺 Physical: {screen['width']}x{screen['height']}")
-        if screen.get("availWidth") and screen.get("availHeight"):
-            resolution_parts.append(f"🖥️ Available: {screen['availWidth']}x{screen['availHeight']}")
-        if viewport.get("width") and viewport.get("height"):
-            resolution_parts.append(f"🔍 Viewport: {viewport['width']}x{viewport['height']}")
-        if screen.get("pixelRatio"):
-            resolution_parts.append(f"📊 Pixel Ratio: {screen['pixelRatio']}")
-        if screen.get("orientation") and isinstance(screen["orientation"], dict):
-            orientation = screen["orientation"]
-            resolution_parts.append(
-                f"📱 Orientation: {orientation.get('type', 'unknown')} ({orientation.get('angle', '0')}°)"
-            )
-        resolution_str = "\n".join(resolution_parts)
-    else:
-        resolution_str = "📊 Resolution: Unknown"
-
-    additional_info = []
-    if device_info:
-        if device_info.get("username") and device_info["username"] != "Unknown":
-            additional_info.append(f"👤 Username: {device_info['username']}")
-        if device_info.get("language"):
-            additional_info.append(f"🌍 Language: {device_info['language']}")
-        if device_info.get("deviceMemory"):
-            additional_info.append(f"💾 Memory: {device_info['deviceMemory']}GB")
-        if device_info.get("hardwareConcurrency"):
-            additional_info.append(f"⚡ CPU Cores: {device_info['hardwareConcurrency']}")
-        if device_info.get("connection"):
-            conn = device_info["connection"]
-            if conn.get("type"):
-                additional_info.append(f"📡 Network: {conn['type']}")
-            if conn.get("downlink"):
-                additional_info.append(f"⬇️ Speed: {conn['downlink']} Mbps")
-        if device_info.get("platformDetails"):
-            pd = device_info["platformDetails"]
-            if pd.get("platform") and pd.get("platformVersion"):
-                additional_info.append(f"🖥️ Platform: {pd['platform']} {pd['platformVersion']}")
-            if pd.get("architecture"):
-                additional_info.append(f"🔧 Architecture: {pd['architecture']}")
-
-    return device_str, os_str, browser_str, resolution_str, additional_info
-
-
-def send_message_webhook(name: str, email: str, subject: str, message: str, ip_address: str, db: Session):
-    webhooks = get_webhooks_by_type(db, "message")
-    if not webhooks:
-        return False
-
-    ip_info = get_ip_info(ip_address)
-    timestamp = datetime.now()
-    success = False
+def render_message(db: Session, message_id, platform: str) -> Optional[Dict[str, Any]]:
+    """Outbox renderer: builds message payloads once the location is known."""
+    geolocation.fill_location(ContactMessage, message_id)
+    contact_message = db.query(ContactMessage).filter(ContactMessage.id == message_id).first()
+    return webhook_payloads.render(platform, "message", message_context(contact_message)) if contact_message else None
+
 
+def queue_digest(db: Session, summary: Dict[str, Any], webhooks: List[Webhook]) -> int:
     for webhook in webhooks:
-        platform = detect_webhook_platform(webhook.url)
-
-        if platform == "discord":
-            fields = [
-                {"name": "📧  Email", "value": f"```{email}```", "inline": True},
-                {"name": "📝  Subject", "value": f"```fix\n{subject}```", "inline": True},
-                {"name": "💬  Message", "value": f"```fix\n{message}```"},
-            ]
-            if ip_info:
-                location_str = f"{ip_info['city']}, {ip_info['region']}, {ip_info['country']}"
-                fields.extend([
-                    {"name": "🌐  IP Address", "value": f"```yaml\n{ip_address}```", "inline": True},
-                    {"name": "📍  Location", "value": f"```yaml\n{location_str}```", "inline": True},
-                ])
-                image = {"url": f"https://static-maps.yandex.ru/1.x/?ll={ip_info['lon']},{ip_info['lat']}&size=650,400&z=11&l=map&pt={ip_info['lon']},{ip_info['lat']},pm2rdm1"}
-            else:
-                fields.append({"name": "🌐  IP Address", "value": f"```yaml\n{ip_address}```", "inline": True})
-                image = None
-            payload = {"embeds": [{"title": f"📨  New Message from {name}", "color": 16776960, "fields": fields, "footer": {"text": "Portfolio Contact Form • Powered by IP-API"}, "timestamp": timestamp.isoformat()}]}
-            if image:
-                payload["embeds"][0]["image"] = image
-
-        elif platform == "slack":
-            blocks = [
-                {"type": "header", "text": {"type": "plain_text", "text": f"📨 New Message from {name}", "emoji": True}},
-                {"type": "section", "fields": [{"type": "mrkdwn", "text": f"*Email:*\n{email}"}, {"type": "mrkdwn", "text": f"*Subject:*\n{subject}"}]},
-                {"type": "section", "text": {"type": "mrkdwn", "text": f"*Message:*\n>{message}"}},
-            ]
-            if ip_info:
-                location_str = f"{ip_info['city']}, {ip_info['region']}, {ip_info['country']}"
-                blocks.append({"type": "section", "fields": [{"type": "mrkdwn", "text": f"*IP Address:*\n{ip_address}"}, {"type": "mrkdwn", "text": f"*Location:*\n{location_str}"}]})
-                blocks.append({"type": "image", "title": {"type": "plain_text", "text": "Location Map", "emoji": True}, "image_url": f"https://static-maps.yandex.ru/1.x/?ll={ip_info['lon']},{ip_info['lat']}&size=600,300&z=11&l=map&pt={ip_info['lon']},{ip_info['lat']},pm2rdm1&lang=en", "alt_text": "Map showing visitor location"})
-            else:
-                blocks.append({"type": "section", "fields": [{"type": "mrkdwn", "text": f"*IP Address:*\n{ip_address}"}]})
-            blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": f"Sent at: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"}]})
-            payload = {"blocks": blocks}
-
-        elif platform == "teams":
-            facts = [{"name": "Email", "value": email}, {"name": "Subject", "value": subject}]
-            if ip_info:
-                facts.extend([{"name": "IP Address", "value": ip_address}, {"name": "Location", "value": f"{ip_info['city']}, {ip_info['region']}, {ip_info['country']}"}])
-            else:
-                facts.append({"name": "IP Address", "value": ip_address})
-            payload = {"@type": "MessageCard", "@context": "http://schema.org/extensions", "themeColor": "0078D7", "summary": f"New message from {name}", "sections": [{"activityTitle": f"📨 New Message from {name}", "facts": facts, "text": message}]}
-
-        else:
-            payload = {"event": "message", "data": {"timestamp": timestamp.isoformat(), "fullname": name, "email": email, "subject": subject, "message": message, "ip_address": ip_address}}
-            if ip_info:
-                payload["data"]["location"] = {"city": ip_info["city"], "region": ip_info["region"], "country": ip_info["country"], "coordinates": {"lat": ip_info["lat"], "lon": ip_info["lon"]}}
+        outbox.enqueue(db, "visitor_digest", webhook.url, webhook_payloads.render(webhook.platform, "visitor_digest", summary), platform=webhook.platform)
+    return len(webhooks)
+
+
+def log_visits(batch: List[Dict[str, Any]], db: Session) -> int:
+    """Store a batch of visits and, in the same transaction, queue their visitor webhooks; returns how many were queued."""
+    # Resolved first: lookups commit on their own connection, which must not wait on this transaction's write lock
+    locations = geolocation.lookup_many(visit["ip_address"] for visit in batch if visit["ip_address"] != "127.0.0.1")
+    webhooks = get_webhooks_by_type(db, "visitor")
+    device_infos = device_store.take_many(db, (visit.get("session_key") for visit in batch))
+
+    rows = []
+    for visit in batch:
+        ip_address = visit["ip_address"]
+        # Only the first visit of a session in the batch gets the device info, as with one write per visit
+        device_info = device_infos.pop(visit.get("session_key"), None)
+        location = geolocation.LOCAL_LOCATION if ip_address == "127.0.0.1" else locations.get(ip_address)
+        rows.append((
+            {"id": uuid.uuid4(), "ip_address": ip_address, "created": visit["created"], **visits.entry_fields(visit["user_agent"], device_info), **geolocation.location_columns(location)},
+            device_info,
+        ))
+    # Bulk insert from plain dicts: building ORM objects for every visit costs more than the insert itself
+    db.execute(insert(Entry), [entry for entry, _ in rows])
+    rollups.record_visits(db, (
+        (entry["created"], entry["ip_address"], rollups.visit_dimensions(entry["device_family"], entry["browser_family"], entry.get("country")))
+        for entry, _ in rows
+    ))
+
+    queued = 0
+    # Applied only after the commit, so a batch that fails and is retried is not counted twice
+    digest = visitor_digest.begin()
+    for entry, device_info in rows:
+        ip_address = entry["ip_address"]
+        if not webhooks or ip_address == "127.0.0.1" or entry["is_bot"] or digest.is_repeat(ip_address):
+            continue
+
+        if visitor_digest.enabled:
+            digest.add(ip_address, entry.get("country"), entry["device_family"], entry["browser_family"])
+            continue
+
+        device_str, os_str, browser_str, resolution_str, additional_info = visits.describe(entry, device_info)
+        context = {
+            "id": entry["id"],
+            "ip_address": ip_address,
+            "location": locations.get(ip_address),
+            "device": device_str,
+            "os": os_str,
+            "browser": browser_str,
+            "display": resolution_str,
+            "additional": additional_info,
+            "timestamp": datetime.now(),
+        }
+        for webhook in webhooks:
+            payload = webhook_payloads.render(webhook.platform, "visitor", context)
+            outbox.enqueue(db, "visitor", webhook.url, payload, source_id=entry["id"], platform=webhook.platform)
+        queued += len(webhooks)
+
+    db.commit()
+    summaries = digest.commit()
+    if summaries:
+        # The visits are stored: a failure here must not make the buffer write them again
+        try:
+            digests = sum(queue_digest(db, summary, webhooks) for summary in summaries)
+            db.commit()
+            queued += digests
+        except Exception as e:
+            db.rollback()
+            print(f"Error queueing visitor digest: {e}")
+    return queued
 
+
+def _record_visits(batch: List[Dict[str, Any]]) -> int:
+    db = SessionLocal()
+    try:
         try:
-            r = requests.post(webhook.url, json=payload, headers={"Content-Type": "application/json"}, timeout=5)
-            if 200 <= r.status_code < 300:
-                success = True
+            return log_visits(batch, db)
         except Exception as e:
-            print(f"Error sending message webhook: {e}")
+            db.rollback()
+            print(f"Error in log_visits: {e}")
+            if len(batch) == 1:
+                raise
+        # Write the batch one visit at a time so a single bad visit only loses itself
+        queued = 0
+        written = 0
+        error = None
+        for visit in batch:
+            try:
+                queued += log_visits([visit], db)
+                written += 1
+            except Exception as e:
+                db.rollback()
+                error = e
+                print(f"Error in log_visits: {e}")
+        if not written:
+            # More likely the database than the visits: let the buffer retry them
+            raise error
+        return queued
+    finally:
+        db.close()
+
+
+async def process_visits(batch: List[Dict[str, Any]]):
+    if await asyncio.to_thread(_record_visits, batch):
+        outbox_worker.wake()
+
 
-    return success
+def visit_from_spool(visit: Dict[str, Any]) -> Dict[str, Any]:
+    visit["created"] = datetime.fromisoformat(visit["created"])
+    return visit
 
 
-def send_visitor_webhook(request: Request, db: Session):
+def _queue_digest(summary: Dict[str, Any]) -> int:
+    db = SessionLocal()
     try:
-        webhooks = get_webhooks_by_type(db, "visitor")
-        ip_address = request.client.host if hasattr(request, "client") else None
-        user_agent_str = request.headers.get("user-agent", "Unknown Browser")
-        device_info = device_info_cache.get(ip_address)
-        ip_info = get_ip_info(ip_address)
-        device_str, os_str, browser_str, resolution_str, additional_info = format_device_info(user_agent_str, device_info)
-
-        entry = Entry(
-            device_info=json.dumps({"device": device_str, "os": os_str}),
-            display_info=json.dumps({"resolution": resolution_str}),
-            system_info=json.dumps({"additional": additional_info}),
-            browser_info=json.dumps({"browser": browser_str, "user_agent": user_agent_str}),
-            ip_address=ip_address,
-        )
-        db.add(entry)
+        queued = queue_digest(db, summary, get_webhooks_by_type(db, "visitor"))
         db.commit()
+        return queued
+    finally:
+        db.close()
 
-        if not webhooks or ip_address == "127.0.0.1":
-            device_info_cache.pop(ip_address, None)
-            return
 
-        bot_keywords = ["bot", "crawler", "spider", "headless", "phantomjs", "selenium", "puppeteer", "playwright"]
-        if any(k in user_agent_str.lower() for k in bot_keywords):
-            device_info_cache.pop(ip_address, None)
-            return
+async def flush_visitor_digest(force: bool = False):
+    """Queue the pending digest if its window has elapsed (or unconditionally at shutdown)."""
+    summary = visitor_digest.flush() if force else visitor_digest.take_due()
+    if summary and await asyncio.to_thread(_queue_digest, summary):
+        outbox_worker.wake()
 
-        timestamp = datetime.now()
-        for webhook in webhooks:
-            platform = detect_webhook_platform(webhook.url)
-
-            if platform == "discord":
-                fields = [
-                    {"name": "Device Information", "value": f"```yaml\n{device_str}\n{os_str}\n{browser_str}```", "inline": False},
-                    {"name": "Display", "value": f"```yaml\n{resolution_str}```", "inline": False},
-                ]
-                if additional_info:
-                    fields.append({"name": "System Info", "value": f"```yaml\n{chr(10).join(additional_info)}```", "inline": False})
-                if ip_info:
-                    location_str = f"{ip_info['city']}, {ip_info['region']}, {ip_info['country']}"
-                    fields.extend([{"name": "🔍  IP Address", "value": f"```yaml\n{ip_address}```", "inline": True}, {"name": "📍  Location", "value": f"```yaml\n{location_str}```", "inline": True}])
-                    image = {"url": f"https://static-maps.yandex.ru/1.x/?ll={ip_info['lon']},{ip_info['lat']}&size=650,400&z=11&l=map&pt={ip_info['lon']},{ip_info['lat']},pm2rdm1&lang=en"}
-                else:
-                    fields.append({"name": "🔍  IP Address", "value": f"```yaml\n{ip_address}```", "inline": True})
-                    image = None
-                payload = {"embeds": [{"title": "🔔  New Website Visit", "description": f"```Entry ID: {entry.id}```", "color": 5763719, "fields": fields, "footer": {"text": "Portfolio Website • Powered by IP-API"}, "timestamp": timestamp.isoformat()}]}
-                if image:
-                    payload["embeds"][0]["image"] = image
-
-            elif platform == "slack":
-                blocks = [
-                    {"type": "header", "text": {"type": "plain_text", "text": "🔔 New Website Visit", "emoji": True}},
-                    {"type": "section", "fields": [{"type": "mrkdwn", "text": f"*Device:*\n{device_str}"}, {"type": "mrkdwn", "text": f"*OS:*\n{os_str}"}]},
-                    {"type": "section", "fields": [{"type": "mrkdwn", "text": f"*Browser:*\n{browser_str}"}]},
-                    {"type": "section", "text": {"type": "mrkdwn", "text": f"*Display:*\n{resolution_str.replace(chr(10), ', ')}"}},
-                ]
-                if ip_info:
-                    location_str = f"{ip_info['city']}, {ip_info['region']}, {ip_info['country']}"
-                    blocks.append({"type": "section", "fields": [{"type": "mrkdwn", "text": f"*IP Address:*\n{ip_address}"}, {"type": "mrkdwn", "text": f"*Location:*\n{location_str}"}]})
-                    blocks.append({"type": "image", "title": {"type": "plain_text", "text": "Location Map", "emoji": True}, "image_url": f"https://static-maps.yandex.ru/1.x/?ll={ip_info['lon']},{ip_info['lat']}&size=600,300&z=11&l=map&pt={ip_info['lon']},{ip_info['lat']},pm2rdm1&lang=en", "alt_text": "Map showing visitor location"})
-                else:
-                    blocks.append({"type": "section", "fields": [{"type": "mrkdwn", "text": f"*IP Address:*\n{ip_address}"}]})
-                blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": f"Visited at: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"}]})
-                payload = {"blocks": blocks}
-
-            elif platform == "teams":
-                facts = [{"name": "Device", "value": device_str}, {"name": "OS", "value": os_str}, {"name": "Browser", "value": browser_str}]
-                if ip_info:
-                    facts.extend([{"name": "IP Address", "value": ip_address}, {"name": "Location", "value": f"{ip_info['city']}, {ip_info['region']}, {ip_info['country']}"}])
-                else:
-                    facts.append({"name": "IP Address", "value": ip_address})
-                payload = {"@type": "MessageCard", "@context": "http://schema.org/extensions", "themeColor": "0078D7", "summary": "New Website Visit", "sections": [{"activityTitle": "🔔 New Website Visit", "facts": facts, "text": f"Display: {resolution_str.replace(chr(10), ', ')}"}]}
-
-            else:
-                payload = {"event": "visitor", "data": {"id": str(entry.id), "timestamp": timestamp.isoformat(), "device_info": device_str, "browser_info": browser_str, "system_info": os_str, "display_info": resolution_str, "ip_address": ip_address}}
-                if ip_info:
-                    payload["data"]["location"] = {"city": ip_info["city"], "region": ip_info["region"], "country": ip_info["country"], "coordinates": {"lat": ip_info["lat"], "lon": ip_info["lon"]}}
 
-            try:
-                r = requests.post(webhook.url, json=payload, headers={"Content-Type": "application/json"}, timeout=5)
-                print(f"Visitor webhook {'sent' if 200 <= r.status_code < 300 else 'failed'}: {platform} {r.status_code}")
-            except Exception as e:
-                print(f"Error sending visitor webhook: {e}")
+async def flush_visitor_digest_periodically():
+    while True:
+        await asyncio.sleep(DIGEST_CHECK_INTERVAL)
+        try:
+            await flush_visitor_digest()
+        except Exception as e:
+            print(f"Error sending visitor digest: {e}")
 
-        device_info_cache.pop(ip_address, None)
 
-    except Exception as e:
-        print(f"Error in send_visitor_webhook: {e}")
+def locate_message(message_id):
+    geolocation.fill_location(ContactMessage, message_id)
+
 
+# Visit logging and message geolocation run here, after the response has gone out
+visit_buffer = WriteBehind(
+    process_visits,
+    name="visits",
+    maxsize=VISIT_BUFFER_SIZE,
+    flush_rows=VISIT_FLUSH_ROWS,
+    flush_interval=VISIT_FLUSH_INTERVAL_MS / 1000,
+    durability=VISIT_DURABILITY,
+    spool_dir=VISIT_SPOOL_DIR,
+    decode=visit_from_spool,
+)
+location_dispatcher = Dispatcher(locate_message, name="location", maxsize=LOCATION_QUEUE_SIZE, workers=1)
+# Collapses visitor notifications into digests and drops repeats (see digest.py for the env settings)
+visitor_digest = VisitDigest()
+# Webhooks are committed to the outbox with the row they describe and sent from here
+outbox_worker = OutboxWorker(renderers={"message": render_message})
+
+
+def log_config_change(changed: Dict[str, Optional[int]], snapshot) -> None:
+    sections = ", ".join(f"{name} (removed)" if version is None else name for name, version in sorted(changed.items()))
+    print(f"Config version {snapshot.version}: {sections} changed")
+
+
+ConfigManager.subscribe(log_config_change)
 
 router = APIRouter(prefix="/api", tags=["api"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+async def current_snapshot() -> ConfigSnapshot:
+    """The published config snapshot; config_events' watcher reloads it, so no file access here."""
+    snapshot = ConfigManager.current()
+    if snapshot is None:
+        # Only before config_events has started (e.g. the router used without the app's lifespan)
+        snapshot = await asyncio.to_thread(ConfigManager.snapshot)
+    return snapshot
 
 
 @router.get("/config")
-async def get_config(request: Request, db: Session = Depends(get_db)):
-    """Return portfolio config as JSON and log the visit."""
+async def get_config(request: Request):
+    """Return portfolio config as JSON and queue the visit for logging.
+
+    The body is served straight from the in-memory snapshot, pre-encoded and
+    pre-compressed, with no parsing or disk access; conditional requests with
+    a matching ETag get a 304.
+    """
     try:
-        config = ConfigManager.read_config()
-        try:
-            send_visitor_webhook(request, db)
-        except Exception as e:
-            print(f"Error in visitor webhook: {e}")
-        return config
+        snapshot = await current_snapshot()
+        ip_address = request.client.host if request.client else None
+        visit_buffer.submit({
+            "ip_address": ip_address,
+            "user_agent": request.headers.get("user-agent", "Unknown Browser"),
+            "session_key": device_store.session_key(request.headers.get(device_store.SESSION_HEADER), ip_address),
+            "created": datetime.now(),
+        })
+        headers = {
+            "ETag": snapshot.etag,
+            "X-Config-Version": str(snapshot.version),
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if snapshot.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        body, encoding = snapshot.encode_for(request.headers.get("accept-encoding", ""))
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
     except Exception as e:
         print(f"Error loading config: {e}")
         return JSONResponse(status_code=500, content={"detail": str(e)})
 
 
+@router.get("/config/stream")
+async def config_stream(request: Request):
+    """Server-sent events with the config sections that change from now on.
+
+    Pass the version the page was rendered from (``X-Config-Version`` of
+    /api/config) as ``since`` to also get what changed in between; EventSource
+    resumes from ``Last-Event-ID`` on its own after a reconnect.
+    """
+    since = parse_version(request.headers.get("last-event-id") or request.query_params.get("since"))
+    stream = config_events.open(since)
+    if stream is None:
+        return JSONResponse(status_code=503, content={"detail": "Too many config streams"}, headers={"Retry-After": "30"})
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx would otherwise hold events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/config/{section}")
+async def get_config_section(section: str, request: Request):
+    """Return one top-level config section with its own ETag (not counted as a visit)."""
+    config_section = (await current_snapshot()).sections.get(section)
+    if config_section is None:
+        raise HTTPException(status_code=404, detail=f"Section {section} not found")
+    headers = {
+        "ETag": config_section.etag,
+        "X-Config-Section-Version": str(config_section.version),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if config_section.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    body, encoding = config_section.encode_for(request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.post("/contact")
-async def send_message(request: Request, db: Session = Depends(get_db)):
+async def send_message(request: Request, db: AsyncSession = Depends(get_db)):
     """Handle contact form submission (accepts JSON body)."""
     try:
         body = await request.json()
@@ -323,8 +348,14 @@ async def send_message(request: Request, db: Session = Depends(get_db)):
             viewed=False,
         )
         db.add(contact_message)
-        db.commit()
-        send_message_webhook(fullname, email, subject, message, ip_address, db)
+        await db.flush()
+        webhooks = (await db.execute(select(Webhook).where(Webhook.name == "message"))).scalars().all()
+        for webhook in webhooks:
+            outbox.enqueue(db, "message", webhook.url, source_id=contact_message.id, platform=webhook.platform)
+        await db.commit()
+        location_dispatcher.submit(contact_message.id)
+        if webhooks:
+            outbox_worker.wake()
         return {"status": "success"}
     except Exception as e:
         print(f"Error saving contact message: {e}")
@@ -333,13 +364,36 @@ async def send_message(request: Request, db: Session = Depends(get_db)):
 
 @router.post("/device-info")
 async def device_info(request: Request):
-    """Cache client-side device info for enriching visitor webhook."""
+    """Store client-side device info, keyed by the X-Session-Id header, for the visit it belongs to."""
     try:
-        info = await request.json()
-        ip_address = request.client.host if hasattr(request, "client") else None
-        if ip_address:
-            device_info_cache[ip_address] = info
+        body = await request.body()
+        if len(body) > device_store.MAX_ENTRY_BYTES:
+            return JSONResponse(status_code=413, content={"detail": "Device info too large"})
+        info = json.loads(body)
+        if not isinstance(info, dict):
+            return JSONResponse(status_code=400, content={"detail": "Device info must be an object"})
+        ip_address = request.client.host if request.client else None
+        key = device_store.session_key(request.headers.get(device_store.SESSION_HEADER), ip_address)
+        if key:
+            await asyncio.to_thread(device_store.put, key, info)
         return {"status": "success"}
+    except device_store.EntryTooLarge as e:
+        return JSONResponse(status_code=413, content={"detail": str(e)})
     except Exception as e:
         print(f"Error handling device info: {e}")
         return {"status": "error"}
+
+
+@router.get("/metrics")
+async def metrics():
+    """Expose background pipeline health (queue depth, lag, drops)."""
+    return {
+        "visitor_queue": visit_buffer.stats(),
+        "location_queue": location_dispatcher.stats(),
+        "webhook_outbox": outbox_worker.stats(),
+        "visitor_digest": visitor_digest.stats(),
+        "user_agent_cache": visits.user_agent_cache_stats(),
+        "config_stream": config_events.stats(),
+        "publish": publisher.stats(),
+        "config_sections": {name: section.version for name, section in (await current_snapshot()).sections.items()},
+    }
@@ -0,0 +1,332 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import requests
+from sqlalchemy.dialects.sqlite import insert
+
+from database import SessionLocal
+from models import ContactMessage, Entry, IpLocation
+
+MEMORY_CACHE_SIZE = 4096
+# ip-api accepts at most 100 queries per /batch request
+BATCH_SIZE = 100
+# Successful lookups are kept for a week, failed ones ("private range", "invalid query") for an hour
+POSITIVE_TTL = timedelta(days=7)
+NEGATIVE_TTL = timedelta(hours=1)
+# After a transport error the provider is left alone this long (stale rows or None are served)
+PROVIDER_BACKOFF = timedelta(seconds=30)
+
+LOCATION_FIELDS = ("country", "city", "region", "lat", "lon", "timezone", "isp", "org")
+LOCAL_LOCATION = {"country": "Local", "city": "Local"}
+
+
+class IpApiProvider:
+    """Looks up IP locations with the free ip-api.com JSON endpoint."""
+
+    url = "http://ip-api.com/json/{ip}"
+    batch_url = "http://ip-api.com/batch?fields=status,message,query,country,city,regionName,lat,lon,timezone,isp,org"
+    timeout = 5
+
+    def lookup(self, ip_address: str) -> Optional[Dict[str, Any]]:
+        """Return location fields, or None if ip-api has no answer for this IP.
+
+        Transport errors are raised so the caller does not cache them.
+        """
+        r = requests.get(self.url.format(ip=ip_address), timeout=self.timeout)
+        r.raise_for_status()
+        return self.parse(r.json())
+
+    def lookup_batch(self, ip_addresses: list[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Resolve up to BATCH_SIZE IPs in one request; same semantics as lookup()."""
+        r = requests.post(self.batch_url, json=ip_addresses, timeout=self.timeout)
+        r.raise_for_status()
+        return {item["query"]: self.parse(item) for item in r.json() if "query" in item}
+
+    @staticmethod
+    def parse(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if data.get("status") != "success":
+            return None
+        return {
+            "country": data.get("country"),
+            "city": data.get("city"),
+            "region": data.get("regionName"),
+            "lat": data.get("lat"),
+            "lon": data.get("lon"),
+            "timezone": data.get("timezone"),
+            "isp": data.get("isp"),
+            "org": data.get("org"),
+        }
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+
+
+_provider = IpApiProvider()
+_memory: "OrderedDict[str, tuple[datetime, Optional[Dict[str, Any]]]]" = OrderedDict()
+_inflight: Dict[str, _Flight] = {}
+_lock = threading.Lock()
+_provider_down_until = datetime.min
+
+
+def set_provider(provider) -> None:
+    """Swap the lookup provider (e.g. a local stub in tests) and clear the memory cache."""
+    global _provider, _provider_down_until
+    with _lock:
+        _provider = provider
+        _provider_down_until = datetime.min
+        _memory.clear()
+
+
+def _provider_failed(error: Exception, what: str) -> None:
+    global _provider_down_until
+    print(f"Error getting location for {what}: {error}")
+    _provider_down_until = datetime.now() + PROVIDER_BACKOFF
+
+
+def _remember(ip_address: str, expires: datetime, info: Optional[Dict[str, Any]]) -> None:
+    with _lock:
+        _memory[ip_address] = (expires, info)
+        _memory.move_to_end(ip_address)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def _from_memory(ip_address: str):
+    with _lock:
+        cached = _memory.get(ip_address)
+        if cached is None:
+            return False, None
+        if cached[0] <= datetime.now():
+            del _memory[ip_address]
+            return False, None
+        _memory.move_to_end(ip_address)
+        return True, cached[1]
+
+
+def _row_to_info(row: IpLocation) -> Optional[Dict[str, Any]]:
+    if not row.found:
+        return None
+    return {field: getattr(row, field) for field in LOCATION_FIELDS}
+
+
+def _resolve(ip_address: str) -> Optional[Dict[str, Any]]:
+    now = datetime.now()
+    db = SessionLocal()
+    try:
+        row = db.query(IpLocation).filter(IpLocation.ip_address == ip_address).first()
+        if row and row.expires > now:
+            info = _row_to_info(row)
+            _remember(ip_address, row.expires, info)
+            return info
+
+        # Serve a stale row rather than nothing while the provider is unreachable
+        if now < _provider_down_until:
+            return _row_to_info(row) if row else None
+        try:
+            info = _provider.lookup(ip_address)
+        except Exception as e:
+            _provider_failed(e, ip_address)
+            return _row_to_info(row) if row else None
+
+        expires = now + (POSITIVE_TTL if info else NEGATIVE_TTL)
+        db.merge(IpLocation(ip_address=ip_address, found=info is not None, fetched=now, expires=expires, **(info or {})))
+        db.commit()
+        _remember(ip_address, expires, info)
+        return info
+    finally:
+        db.close()
+
+
+def lookup(ip_address: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Return the cached location for an IP, resolving it at most once across concurrent callers."""
+    if not ip_address:
+        return None
+    hit, info = _from_memory(ip_address)
+    if hit:
+        return info
+
+    with _lock:
+        flight = _inflight.get(ip_address)
+        leader = flight is None
+        if leader:
+            flight = _inflight[ip_address] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        return flight.result
+
+    try:
+        flight.result = _resolve(ip_address)
+        return flight.result
+    finally:
+        with _lock:
+            _inflight.pop(ip_address, None)
+        flight.done.set()
+
+
+def _store(db, results: Dict[str, Optional[Dict[str, Any]]], now: datetime) -> None:
+    """Upsert a batch of provider answers in one statement and remember them in memory."""
+    rows = []
+    for ip_address, info in results.items():
+        expires = now + (POSITIVE_TTL if info else NEGATIVE_TTL)
+        rows.append({
+            "ip_address": ip_address, "found": info is not None, "fetched": now, "expires": expires,
+            **{field: (info or {}).get(field) for field in LOCATION_FIELDS},
+        })
+        _remember(ip_address, expires, info)
+    if rows:
+        stmt = insert(IpLocation)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["ip_address"],
+            set_={column: stmt.excluded[column] for column in rows[0] if column != "ip_address"},
+        )
+        db.connection().execute(stmt, rows)
+
+
+def _fetch_chunk(chunk: list[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    lookup_batch = getattr(_provider, "lookup_batch", None)
+    if lookup_batch is not None:
+        return lookup_batch(chunk)
+    return {ip: _provider.lookup(ip) for ip in chunk}
+
+
+def iter_lookup_many(ip_addresses: Iterable[str]) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """Yield (ip, location) pairs as they are resolved.
+
+    Cached answers come first, then one provider batch per BATCH_SIZE misses.
+    A failed batch yields stale rows (or None) for its IPs, and the provider
+    is then skipped for PROVIDER_BACKOFF.
+    """
+    pending = []
+    for ip in dict.fromkeys(ip for ip in ip_addresses if ip):
+        hit, info = _from_memory(ip)
+        if hit:
+            yield ip, info
+        else:
+            pending.append(ip)
+    if not pending:
+        return
+
+    now = datetime.now()
+    db = SessionLocal()
+    try:
+        stale: Dict[str, IpLocation] = {}
+        fresh = set()
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(pending), 500):
+            rows = db.query(IpLocation).filter(IpLocation.ip_address.in_(pending[i:i + 500])).all()
+            for row in rows:
+                if row.expires > now:
+                    info = _row_to_info(row)
+                    _remember(row.ip_address, row.expires, info)
+                    fresh.add(row.ip_address)
+                    yield row.ip_address, info
+                else:
+                    stale[row.ip_address] = row
+        misses = [ip for ip in pending if ip not in fresh]
+
+        for i in range(0, len(misses), BATCH_SIZE):
+            chunk = misses[i:i + BATCH_SIZE]
+            results = {}
+            if datetime.now() >= _provider_down_until:
+                try:
+                    results = _fetch_chunk(chunk)
+                except Exception as e:
+                    _provider_failed(e, f"batch of {len(chunk)}")
+            results = {ip: results[ip] for ip in chunk if ip in results}
+            _store(db, results, now)
+            db.commit()
+            for ip in chunk:
+                if ip in results:
+                    yield ip, results[ip]
+                else:
+                    yield ip, _row_to_info(stale[ip]) if ip in stale else None
+    finally:
+        db.close()
+
+
+def lookup_many(ip_addresses: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Resolve many IPs at once, using the provider's batch endpoint for cache misses."""
+    return dict(iter_lookup_many(ip_addresses))
+
+
+def location_columns(info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The denormalized location columns of an Entry or ContactMessage, empty when unknown."""
+    if not info:
+        return {}
+    return {
+        "country": info.get("country"),
+        "city": info.get("city"),
+        "region": info.get("region"),
+        "latitude": info.get("lat"),
+        "longitude": info.get("lon"),
+        "timezone": info.get("timezone"),
+        "isp": info.get("isp"),
+    }
+
+
+def row_location(row) -> Optional[Dict[str, Any]]:
+    """The location stored on an Entry or ContactMessage, in lookup() form; None when it has none."""
+    if row.country is None:
+        return None
+    return {
+        "country": row.country,
+        "city": row.city,
+        "region": row.region,
+        "lat": row.latitude,
+        "lon": row.longitude,
+        "timezone": row.timezone,
+        "isp": row.isp,
+    }
+
+
+def apply_location(row, info: Optional[Dict[str, Any]]) -> None:
+    """Copy a location onto the denormalized columns of an Entry or ContactMessage."""
+    for column, value in location_columns(info).items():
+        setattr(row, column, value)
+
+
+def fill_location(model, row_id) -> None:
+    """Resolve and store the location of a freshly inserted row."""
+    db = SessionLocal()
+    try:
+        row = db.query(model).filter(model.id == row_id).first()
+        if not row or not row.ip_address:
+            return
+        apply_location(row, LOCAL_LOCATION if row.ip_address == "127.0.0.1" else lookup(row.ip_address))
+        db.commit()
+    finally:
+        db.close()
+
+
+def backfill_locations(batch_size: int = 500) -> int:
+    """Fill location columns on existing entries and messages that have none; returns rows updated."""
+    updated = 0
+    db = SessionLocal()
+    try:
+        for model in (Entry, ContactMessage):
+            last_id = None
+            while True:
+                query = db.query(model).filter(model.country.is_(None), model.ip_address.isnot(None))
+                if last_id is not None:
+                    query = query.filter(model.id > last_id)
+                rows = query.order_by(model.id).limit(batch_size).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                locations = lookup_many(r.ip_address for r in rows if r.ip_address != "127.0.0.1")
+                for row in rows:
+                    if row.ip_address == "127.0.0.1":
+                        apply_location(row, LOCAL_LOCATION)
+                    else:
+                        apply_location(row, locations.get(row.ip_address))
+                    updated += row.country is not None
+                db.commit()
+    finally:
+        db.close()
+    return updated
@@ -0,0 +1,83 @@
+"""Minimal HTTP load generator for the front service (standard library only).
+
+    python loadtest.py http://127.0.0.1:84/api/config --concurrency 32 --duration 20
+
+Each client thread keeps one keep-alive connection open and issues GETs back
+to back; the summary reports throughput and latency percentiles.
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def _client(url, deadline, headers, latencies, errors, lock):
+    parts = urlsplit(url)
+    conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    conn = conn_cls(parts.hostname, parts.port, timeout=10)
+    local, failed = [], 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                failed += 1
+            else:
+                local.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            conn.close()
+            conn = conn_cls(parts.hostname, parts.port, timeout=10)
+    conn.close()
+    with lock:
+        latencies.extend(local)
+        errors.append(failed)
+
+
+def run(url: str, concurrency: int, duration: float, headers: dict) -> dict:
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=_client, args=(url, deadline, headers, latencies, errors, lock)) for _ in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--header", action="append", default=[], help="Extra header, e.g. 'Accept-Encoding: gzip'")
+    args = parser.parse_args()
+    headers = dict(h.split(":", 1) for h in args.header)
+    headers = {k.strip(): v.strip() for k, v in headers.items()}
+    result = run(args.url, args.concurrency, args.duration, headers)
+    print(
+        f"{result['requests']} requests, {result['errors']} errors, {result['rps']:.0f} req/s, "
+        f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import json
+import re
+import uuid
+from datetime import datetime
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from database import Base, create_sqlite_engine, engine
+import models
+import rollups
+from visits import BOT_KEYWORDS, parse_user_agent
+from webhook_payloads import detect_platform
+
+
+def _add_missing_columns(conn, table) -> None:
+    """Add nullable model columns that an existing table does not have yet."""
+    existing = _columns(conn, table.name)
+    for column in table.columns:
+        if column.name not in existing and column.nullable:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def _columns(conn, table_name: str) -> set:
+    return {c["name"] for c in inspect(conn).get_columns(table_name)}
+
+
+def _create_indexes(conn, table) -> None:
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def baseline(conn) -> None:
+    """Create any table that does not exist yet, in its current shape."""
+    Base.metadata.create_all(bind=conn)
+
+
+def location_columns(conn) -> None:
+    _add_missing_columns(conn, models.Entry.__table__)
+    _add_missing_columns(conn, models.ContactMessage.__table__)
+
+
+def entry_and_message_indexes(conn) -> None:
+    _create_indexes(conn, models.Entry.__table__)
+    _create_indexes(conn, models.ContactMessage.__table__)
+
+
+def visit_rollups(conn) -> None:
+    """Create the rollup tables (they are first built in structured_entries)."""
+    models.VisitRollup.__table__.create(conn, checkfirst=True)
+    models.VisitDailyIp.__table__.create(conn, checkfirst=True)
+    _create_indexes(conn, models.VisitDailyIp.__table__)
+
+
+def entry_keyset_and_bot_flag(conn) -> None:
+    """Index (created, id) for keyset pagination and flag existing bot entries."""
+    conn.execute(text("DROP INDEX IF EXISTS ix_entries_created"))
+    _add_missing_columns(conn, models.Entry.__table__)
+    _create_indexes(conn, models.Entry.__table__)
+    if "browser_info" in _columns(conn, "entries"):
+        bot_match = " OR ".join(f"lower(browser_info) LIKE '%{k}%'" for k in BOT_KEYWORDS)
+        conn.execute(text(f"UPDATE entries SET is_bot = CASE WHEN {bot_match} THEN 1 ELSE 0 END WHERE is_bot IS NULL"))
+
+
+def _json(value):
+    try:
+        return json.loads(value) if value else {}
+    except ValueError:
+        return {}
+
+
+def _dimensions(text_value: str, label: str):
+    match = re.search(rf"{label}: (\d+)x(\d+)", text_value or "")
+    return (int(match.group(1)), int(match.group(2))) if match else (None, None)
+
+
+def _legacy_entry_fields(row) -> dict:
+    """Typed Entry columns recovered from the old pre-formatted JSON strings."""
+    user_agent = _json(row.browser_info).get("user_agent") or ""
+    resolution = _json(row.display_info).get("resolution", "")
+    additional = "\n".join(_json(row.system_info).get("additional", []))
+    screen_width, screen_height = _dimensions(resolution, "Physical")
+    viewport_width, viewport_height = _dimensions(resolution, "Viewport")
+    pixel_ratio = re.search(r"Pixel Ratio: ([\d.]+)", resolution)
+    language = re.search(r"Language: (\S+)", additional)
+    memory = re.search(r"Memory: ([\d.]+)GB", additional)
+    cores = re.search(r"CPU Cores: (\d+)", additional)
+    return {
+        "user_agent": user_agent or None,
+        **(parse_user_agent(user_agent)._asdict() if user_agent else {}),
+        "screen_width": screen_width,
+        "screen_height": screen_height,
+        "viewport_width": viewport_width,
+        "viewport_height": viewport_height,
+        "pixel_ratio": float(pixel_ratio.group(1)) if pixel_ratio else None,
+        "language": language.group(1)[:64] if language else None,
+        "device_memory": float(memory.group(1)) if memory else None,
+        "cpu_cores": int(cores.group(1)) if cores else None,
+    }
+
+
+def structured_entries(conn) -> None:
+    """Rebuild entries without the JSON-string columns, converting old rows, then build the rollups."""
+    if "device_info" in _columns(conn, "entries"):
+        for index in inspect(conn).get_indexes("entries"):
+            conn.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+        conn.execute(text("ALTER TABLE entries RENAME TO entries_legacy"))
+        models.Entry.__table__.create(conn)
+        entries = models.Entry.__table__
+        copied = [c.name for c in entries.columns if c.name in _columns(conn, "entries_legacy")]
+        last_rowid = 0
+        while True:
+            rows = conn.execute(text(
+                f"SELECT rowid, {', '.join(copied)}, device_info, display_info, system_info, browser_info "
+                "FROM entries_legacy WHERE rowid > :last ORDER BY rowid LIMIT 1000"
+            ), {"last": last_rowid}).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1].rowid
+            values = []
+            for row in rows:
+                item = {name: getattr(row, name) for name in copied}
+                item["id"] = uuid.UUID(item["id"])
+                item["created"] = datetime.fromisoformat(item["created"])
+                item.update({k: v for k, v in _legacy_entry_fields(row).items() if item.get(k) is None})
+                values.append(item)
+            conn.execute(entries.insert(), values)
+        conn.execute(text("DROP TABLE entries_legacy"))
+
+    if conn.execute(text("SELECT COUNT(*) FROM visit_rollups")).scalar() == 0:
+        # compact() also fills visit_ips, which only all_time_visitors creates on older databases
+        models.VisitIp.__table__.create(conn, checkfirst=True)
+        rollups.compact(Session(bind=conn), days=None)
+
+
+def webhook_outbox(conn) -> None:
+    models.WebhookDelivery.__table__.create(conn, checkfirst=True)
+    _create_indexes(conn, models.WebhookDelivery.__table__)
+
+
+def webhook_platform(conn) -> None:
+    """Store each webhook's platform instead of detecting it from the URL on every send."""
+    _add_missing_columns(conn, models.Webhook.__table__)
+    _add_missing_columns(conn, models.WebhookDelivery.__table__)
+    for row in conn.execute(text("SELECT id, url FROM webhooks WHERE platform IS NULL")).fetchall():
+        conn.execute(text("UPDATE webhooks SET platform = :p WHERE id = :id"), {"p": detect_platform(row.url), "id": row.id})
+
+
+def device_info_store(conn) -> None:
+    models.DeviceInfo.__table__.create(conn, checkfirst=True)
+    _create_indexes(conn, models.DeviceInfo.__table__)
+
+
+def all_time_visitors(conn) -> None:
+    """Fill visit_ips from the daily IPs and store the all-time totals row."""
+    models.VisitIp.__table__.create(conn, checkfirst=True)
+    conn.execute(text(
+        "INSERT OR IGNORE INTO visit_ips (ip_address, first_seen) "
+        "SELECT ip_address, MIN(day) FROM visit_daily_ips GROUP BY ip_address"
+    ))
+    rollups.reconcile_total(Session(bind=conn))
+
+
+# Append only. Every step must be idempotent: on a fresh database the
+# baseline already creates the latest schema and later steps are no-ops.
+MIGRATIONS = [
+    (1, "baseline", baseline),
+    (2, "location columns", location_columns),
+    (3, "entry and message indexes", entry_and_message_indexes),
+    (4, "visit rollups", visit_rollups),
+    (5, "entry keyset index and bot flag", entry_keyset_and_bot_flag),
+    (6, "structured entry columns", structured_entries),
+    (7, "webhook outbox", webhook_outbox),
+    (8, "webhook platform", webhook_platform),
+    (9, "device info store", device_info_store),
+    (10, "all-time visitor totals", all_time_visitors),
+]
+
+
+def _migration_engine():
+    """Engine whose transactions start with BEGIN IMMEDIATE, so concurrent
+    migrators (front and admin starting together) run one after another and
+    DDL is rolled back with the rest of a failed step."""
+    migration_engine = create_sqlite_engine(engine.url, poolclass=NullPool)
+
+    @event.listens_for(migration_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(migration_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return migration_engine
+
+
+def current_version(conn) -> int:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, applied DATETIME NOT NULL)"
+    ))
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def upgrade() -> int:
+    """Apply pending migrations and return the resulting schema version."""
+    migration_engine = _migration_engine()
+    try:
+        with migration_engine.begin() as conn:
+            version = current_version(conn)
+            for number, name, step in MIGRATIONS:
+                if number <= version:
+                    continue
+                step(conn)
+                conn.execute(
+                    text("INSERT INTO schema_version (version, name, applied) VALUES (:v, :n, :a)"),
+                    {"v": number, "n": name, "a": datetime.now()},
+                )
+                print(f"Applied migration {number}: {name}")
+                version = number
+            return version
+    finally:
+        migration_engine.dispose()
@@ -2,12 +2,15 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import Base
-from sqlalchemy import Column, String, Boolean, DateTime, Text, UUID
+from sqlalchemy import Column, String, Boolean, Date, DateTime, Float, Index, Integer, Text, UUID
 from datetime import datetime
 import uuid
 
 class ContactMessage(Base):
     __tablename__ = "contact_messages"
+    __table_args__ = (
+        Index("ix_contact_messages_archived_viewed_created", "archived", "viewed", "created"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     archived = Column(Boolean, default=False, nullable=False)
@@ -18,17 +21,48 @@ class ContactMessage(Base):
     message = Column(Text, nullable=False)
     subject = Column(String(255), nullable=False)
     viewed = Column(Boolean, default=False, nullable=False)
+    country = Column(String(255), nullable=True)
+    city = Column(String(255), nullable=True)
+    region = Column(String(255), nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    timezone = Column(String(255), nullable=True)
+    isp = Column(String(255), nullable=True)
 
 class Entry(Base):
     __tablename__ = "entries"
+    __table_args__ = (
+        Index("ix_entries_created_id", "created", "id"),
+        Index("ix_entries_ip_address_created", "ip_address", "created"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    device_info = Column(String(255), nullable=False)
-    display_info = Column(String(255), nullable=False)
-    system_info = Column(String(255), nullable=False)
-    browser_info = Column(String(255), nullable=False)
     ip_address = Column(String(45), nullable=True)
     created = Column(DateTime, default=datetime.now, nullable=False)
+    is_bot = Column(Boolean, default=False, nullable=True)
+    user_agent = Column(Text, nullable=True)
+    device_family = Column(String(255), nullable=True)
+    device_brand = Column(String(255), nullable=True)
+    device_model = Column(String(255), nullable=True)
+    os_family = Column(String(255), nullable=True)
+    os_version = Column(String(64), nullable=True)
+    browser_family = Column(String(255), nullable=True)
+    browser_version = Column(String(64), nullable=True)
+    screen_width = Column(Integer, nullable=True)
+    screen_height = Column(Integer, nullable=True)
+    viewport_width = Column(Integer, nullable=True)
+    viewport_height = Column(Integer, nullable=True)
+    pixel_ratio = Column(Float, nullable=True)
+    language = Column(String(64), nullable=True)
+    device_memory = Column(Float, nullable=True)
+    cpu_cores = Column(Integer, nullable=True)
+    country = Column(String(255), nullable=True)
+    city = Column(String(255), nullable=True)
+    region = Column(String(255), nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    timezone = Column(String(255), nullable=True)
+    isp = Column(String(255), nullable=True)
 
 class AdminToken(Base):
     __tablename__ = "admin_token"
@@ -42,4 +76,71 @@ class Webhook(Base):
     name = Column(String(255), nullable=False)
     created = Column(DateTime, default=datetime.now, nullable=False)
     url = Column(String(255), nullable=False)
+    platform = Column(String(16), nullable=True)
 
+class IpLocation(Base):
+    __tablename__ = "ip_locations"
+    ip_address = Column(String(45), primary_key=True)
+    found = Column(Boolean, nullable=False)
+    country = Column(String(255), nullable=True)
+    city = Column(String(255), nullable=True)
+    region = Column(String(255), nullable=True)
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    timezone = Column(String(255), nullable=True)
+    isp = Column(String(255), nullable=True)
+    org = Column(String(255), nullable=True)
+    fetched = Column(DateTime, default=datetime.now, nullable=False)
+    expires = Column(DateTime, nullable=False)
+
+class VisitRollup(Base):
+    __tablename__ = "visit_rollups"
+    period = Column(String(8), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    dimension = Column(String(16), primary_key=True)
+    value = Column(String(255), primary_key=True)
+    views = Column(Integer, default=0, nullable=False)
+    uniques = Column(Integer, default=0, nullable=False)
+
+class VisitDailyIp(Base):
+    __tablename__ = "visit_daily_ips"
+    __table_args__ = (
+        Index("ix_visit_daily_ips_ip_address", "ip_address"),
+    )
+    day = Column(Date, primary_key=True)
+    ip_address = Column(String(45), primary_key=True)
+
+class VisitIp(Base):
+    """Every IP ever seen, so the all-time unique count is kept as a counter instead of a COUNT(DISTINCT)."""
+    __tablename__ = "visit_ips"
+    ip_address = Column(String(45), primary_key=True)
+    first_seen = Column(Date, nullable=False)
+
+class WebhookDelivery(Base):
+    __tablename__ = "webhook_outbox"
+    __table_args__ = (
+        Index("ix_webhook_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    event = Column(String(16), nullable=False)
+    source_id = Column(UUID(as_uuid=True), nullable=True)
+    url = Column(String(255), nullable=False)
+    platform = Column(String(16), nullable=True)
+    payload = Column(Text, nullable=True)
+    status = Column(String(16), default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.now, nullable=False)
+    created = Column(DateTime, default=datetime.now, nullable=False)
+    delivered = Column(DateTime, nullable=True)
+
+class DeviceInfo(Base):
+    __tablename__ = "device_infos"
+    __table_args__ = (
+        Index("ix_device_infos_created", "created"),
+        Index("ix_device_infos_expires", "expires"),
+    )
+    session_id = Column(String(64), primary_key=True)
+    payload = Column(Text, nullable=False)
+    created = Column(DateTime, default=datetime.now, nullable=False)
+    expires = Column(DateTime, nullable=False)
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import WebhookDelivery
+from webhook_payloads import detect_platform
+import webhook_client
+
+# Attempts before a delivery is dead-lettered and left for a manual replay
+MAX_ATTEMPTS = 8
+BATCH_SIZE = 20
+POLL_INTERVAL = 2.0
+# A claimed row goes back to the pool if its worker has not finished with it by then
+LEASE = timedelta(minutes=2)
+RETRY_BASE = timedelta(seconds=30)
+RETRY_MAX = timedelta(hours=1)
+# Delivered rows are kept this long so the admin can see recent deliveries
+RETENTION = timedelta(days=7)
+PURGE_INTERVAL = 3600
+# 4xx answers that may succeed when sent again; any other 4xx is dead-lettered at once
+RETRYABLE_CLIENT_ERRORS = (408, 429)
+
+PENDING = "pending"
+SENDING = "sending"
+DELIVERED = "delivered"
+DEAD = "dead"
+STATUSES = (PENDING, SENDING, DELIVERED, DEAD)
+
+# (db, source_id, platform) -> payload, or None when the source row is gone
+Renderer = Callable[[Session, Any, str], Optional[Dict[str, Any]]]
+
+
+def enqueue(db: Union[Session, AsyncSession], event: str, url: str, payload: Optional[Dict[str, Any]] = None, source_id=None, platform: Optional[str] = None) -> WebhookDelivery:
+    """Add a delivery to the caller's (sync or async) transaction; nothing is sent unless it commits.
+
+    Without a payload the row is rendered by the worker's renderer for ``event``
+    on its first attempt (e.g. once the message location is known).
+    """
+    row = WebhookDelivery(
+        event=event,
+        url=url,
+        platform=platform,
+        source_id=source_id,
+        payload=json.dumps(payload) if payload is not None else None,
+        status=PENDING,
+        attempts=0,
+        next_attempt_at=datetime.now(),
+        created=datetime.now(),
+    )
+    db.add(row)
+    return row
+
+
+def retry_delay(attempts: int, retry_after: Optional[float] = None) -> timedelta:
+    delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+    if retry_after:
+        delay = max(delay, timedelta(seconds=retry_after))
+    return delay
+
+
+def is_permanent(result: webhook_client.DeliveryResult) -> bool:
+    """True when sending the same request again cannot succeed (e.g. 404 for a deleted webhook)."""
+    code = result.status_code
+    return code is not None and 400 <= code < 500 and code not in RETRYABLE_CLIENT_ERRORS
+
+
+def claim(db: Session, limit: int = BATCH_SIZE) -> List[Dict[str, Any]]:
+    """Lease up to ``limit`` due deliveries.
+
+    The select and the lease are one UPDATE statement, so concurrent workers
+    (several front processes) never claim the same row. Rows whose lease ran
+    out (worker crashed mid-send) are due again, which makes delivery
+    at-least-once.
+    """
+    now = datetime.now()
+    due = select(WebhookDelivery.id).where(
+        WebhookDelivery.status.in_((PENDING, SENDING)),
+        WebhookDelivery.next_attempt_at <= now,
+    ).order_by(WebhookDelivery.next_attempt_at).limit(limit)
+    stmt = update(WebhookDelivery).where(WebhookDelivery.id.in_(due)).values(
+        status=SENDING, next_attempt_at=now + LEASE
+    ).returning(
+        WebhookDelivery.id, WebhookDelivery.event, WebhookDelivery.source_id,
+        WebhookDelivery.url, WebhookDelivery.platform, WebhookDelivery.payload, WebhookDelivery.attempts,
+    ).execution_options(synchronize_session=False)
+    rows = [dict(row._mapping) for row in db.execute(stmt)]
+    db.commit()
+    return rows
+
+
+def finish(db: Session, delivery_id, attempts: int, result: webhook_client.DeliveryResult, permanent: bool = False) -> str:
+    """Store the outcome of one attempt and return the row's new status.
+
+    A ``permanent`` failure is dead-lettered without using up the remaining attempts.
+    """
+    row = db.get(WebhookDelivery, delivery_id)
+    if row is None or row.status != SENDING:
+        # Replayed or deleted by the admin while in flight
+        return row.status if row else DEAD
+    now = datetime.now()
+    row.attempts = attempts
+    if result.ok:
+        row.status = DELIVERED
+        row.delivered = now
+        row.last_error = None
+    else:
+        row.last_error = result.error
+        if permanent or attempts >= MAX_ATTEMPTS:
+            row.status = DEAD
+        else:
+            row.status = PENDING
+            row.next_attempt_at = now + retry_delay(attempts, result.retry_after)
+    return row.status
+
+
+def replay(db: Session, delivery_ids: Optional[List[Any]] = None, status: str = DEAD) -> int:
+    """Queue deliveries again with a fresh attempt budget; returns how many were reset."""
+    query = db.query(WebhookDelivery)
+    if delivery_ids is not None:
+        query = query.filter(WebhookDelivery.id.in_(delivery_ids), WebhookDelivery.status != SENDING)
+    else:
+        query = query.filter(WebhookDelivery.status == status)
+    count = query.update(
+        {"status": PENDING, "attempts": 0, "next_attempt_at": datetime.now(), "delivered": None},
+        synchronize_session=False,
+    )
+    db.commit()
+    return count
+
+
+def purge(db: Session, older_than: timedelta = RETENTION) -> int:
+    count = db.query(WebhookDelivery).filter(
+        WebhookDelivery.status == DELIVERED,
+        WebhookDelivery.delivered < datetime.now() - older_than,
+    ).delete(synchronize_session=False)
+    db.commit()
+    return count
+
+
+class OutboxWorker:
+    """Background task that drains the webhook outbox.
+
+    Polls every ``poll_interval`` seconds, or sooner when ``wake()`` is called
+    after new rows were committed. Each batch is sent concurrently through the
+    shared webhook client with a single attempt per row; retries are scheduled
+    on the row itself so they survive restarts.
+    """
+
+    def __init__(self, renderers: Optional[Dict[str, Renderer]] = None, batch_size: int = BATCH_SIZE, poll_interval: float = POLL_INTERVAL):
+        self.renderers = renderers or {}
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._last_purge = 0.0
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Let the batch in flight finish (up to ``timeout``); unsent rows stay in the table."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self.wake()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                sent = await self.run_once()
+            except Exception as e:
+                print(f"Error in webhook outbox worker: {e}")
+                sent = 0
+            if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                try:
+                    await asyncio.to_thread(self._purge)
+                except Exception as e:
+                    print(f"Error purging webhook outbox: {e}")
+            if sent >= self.batch_size:
+                # Probably more due rows waiting
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    def _purge() -> None:
+        db = SessionLocal()
+        try:
+            purge(db)
+        finally:
+            db.close()
+
+    def _claim(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """Lease a batch and render its unrendered rows; returns the number leased and the rows to send.
+
+        A row whose renderer raises is finished as a failed attempt right away,
+        so it backs off and is eventually dead-lettered like any other failure
+        instead of holding its batch until the lease runs out.
+        """
+        db = SessionLocal()
+        try:
+            rows = claim(db, self.batch_size)
+            ready = []
+            for row in rows:
+                if row["payload"] is not None:
+                    row["payload"] = json.loads(row["payload"])
+                    ready.append(row)
+                    continue
+                try:
+                    row["payload"] = self._render(db, row)
+                except Exception as e:
+                    db.rollback()
+                    result = webhook_client.DeliveryResult(row["url"], False, None, 1, f"Error rendering {row['event']} {row['source_id']}: {e}")
+                    self._count(row, result, finish(db, row["id"], row["attempts"] + 1, result))
+                    db.commit()
+                    continue
+                ready.append(row)
+            return len(rows), ready
+        finally:
+            db.close()
+
+    def _render(self, db: Session, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        renderer = self.renderers.get(row["event"])
+        platform = row["platform"] or detect_platform(row["url"])
+        payload = renderer(db, row["source_id"], platform) if renderer else None
+        if payload is not None:
+            # Keep the rendered body so every retry sends the same notification
+            db.query(WebhookDelivery).filter(WebhookDelivery.id == row["id"]).update(
+                {"payload": json.dumps(payload)}, synchronize_session=False
+            )
+        # Also ends the read, so the next row's renderer sees what was committed meanwhile (e.g. its location)
+        db.commit()
+        return payload
+
+    def _finish(self, outcomes) -> None:
+        db = SessionLocal()
+        try:
+            for row, result in outcomes:
+                # A row with nothing to render (source deleted) will not render on a retry either
+                permanent = row["payload"] is None or is_permanent(result)
+                self._count(row, result, finish(db, row["id"], row["attempts"] + 1, result, permanent))
+            db.commit()
+        finally:
+            db.close()
+
+    def _count(self, row: Dict[str, Any], result: webhook_client.DeliveryResult, status: str) -> None:
+        if status == DELIVERED:
+            self.delivered += 1
+        elif status == DEAD:
+            self.dead += 1
+            print(f"Webhook delivery {row['id']} dead-lettered: {result.error}")
+        else:
+            self.retried += 1
+
+    async def run_once(self) -> int:
+        """Claim and send one batch; returns how many rows were claimed."""
+        claimed, rows = await asyncio.to_thread(self._claim)
+        if not rows:
+            return claimed
+
+        async def send(row):
+            if row["payload"] is None:
+                return webhook_client.DeliveryResult(row["url"], False, None, 1, f"Nothing to render for {row['event']} {row['source_id']}")
+            return await webhook_client.deliver(row["url"], row["payload"], attempts=1)
+
+        results = await asyncio.gather(*(send(row) for row in rows))
+        await asyncio.to_thread(self._finish, list(zip(rows, results)))
+        return claimed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dead": self.dead,
+        }
@@ -0,0 +1,218 @@
+"""Publish the config as static files: the SPA's index.html with the config inlined,
+plus content-hashed JSON artifacts that never change once written.
+
+    python publish.py
+
+The front service runs this on startup and whenever the config changes, so a
+page load needs no API round trip before the first render and any static file
+server can cache the JSON artifacts forever.
+"""
+import asyncio
+import fcntl
+import html
+import json
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple, Union
+
+from config_manager import ConfigManager, ConfigSection, ConfigSnapshot, atomic_write
+from static_files import precompress_file
+
+FRONT_APP_DIST = "front-app/dist"
+INDEX_FILE = f"{FRONT_APP_DIST}/index.html"
+# Hashed artifacts and the manifest naming the current ones; served at /published
+PUBLISH_DIR = "data/published"
+MANIFEST_FILE = f"{PUBLISH_DIR}/manifest.json"
+LOCK_FILE = f"{PUBLISH_DIR}/.lock"
+# Artifacts no longer in the manifest are deleted after this many seconds (pages still open may need them)
+ARTIFACT_TTL = 86400
+# How often (seconds) the front re-checks the published files, e.g. after `npm run build` replaced index.html
+PUBLISH_CHECK_INTERVAL = 5.0
+CONFIG_SCRIPT_ID = "portfolio-config"
+
+_CONFIG_SCRIPT = re.compile(rf'<script id="{CONFIG_SCRIPT_ID}"[^>]*>.*?</script>\n?', re.S)
+
+
+def _stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+def _read_manifest() -> Dict[str, Any]:
+    try:
+        with open(MANIFEST_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def artifact_name(prefix: str, content_hash: str) -> str:
+    return f"{prefix}.{content_hash[:16]}.json"
+
+
+def inline_script(snapshot: ConfigSnapshot, config_file: str) -> str:
+    """The config as a JSON script tag; <, > and & are escaped so the data cannot close the tag."""
+    data = snapshot.body.decode("utf-8").replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+    return (
+        f'<script id="{CONFIG_SCRIPT_ID}" type="application/json" data-version="{snapshot.version}" '
+        f'data-etag="{html.escape(snapshot.etag)}" data-src="/published/{config_file}">{data}</script>\n'
+    )
+
+
+def render_index(page: str, script: str) -> str:
+    """Put ``script`` into the head of ``page``, replacing one inlined by an earlier publish."""
+    page = _CONFIG_SCRIPT.sub("", page)
+    if "</head>" in page:
+        return page.replace("</head>", f"{script}</head>", 1)
+    return script + page
+
+
+def _write_artifact(name: str, encoded: Union[ConfigSnapshot, ConfigSection]) -> None:
+    """Write an artifact with its .gz/.br variants (from the snapshot's own compressed bodies)."""
+    path = os.path.join(PUBLISH_DIR, name)
+    variants = [(path, encoded.body), (f"{path}.gz", encoded.gzip)]
+    if encoded.br is not None:
+        variants.append((f"{path}.br", encoded.br))
+    for target, body in variants:
+        if os.path.exists(target):
+            # Content-addressed: already correct, just keep it from being pruned
+            os.utime(target)
+        else:
+            atomic_write(target, body)
+
+
+def _prune(keep: set) -> int:
+    removed = 0
+    cutoff = time.time() - ARTIFACT_TTL
+    for name in os.listdir(PUBLISH_DIR):
+        path = os.path.join(PUBLISH_DIR, name)
+        artifact = name.removesuffix(".gz").removesuffix(".br")
+        if artifact in keep or not artifact.endswith(".json") or artifact == os.path.basename(MANIFEST_FILE):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def publish(snapshot: Optional[ConfigSnapshot] = None) -> bool:
+    """Write the artifacts and index.html for ``snapshot`` (default: the current config).
+
+    Returns False when they are already up to date. Safe to run from several
+    workers at once: a file lock serialises them and the second finds nothing to do.
+    """
+    snapshot = snapshot or ConfigManager.snapshot()
+    os.makedirs(PUBLISH_DIR, exist_ok=True)
+    with open(LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = _read_manifest()
+        index_stamp = _stamp(INDEX_FILE)
+        if manifest.get("etag") == snapshot.etag and manifest.get("index_stamp") == (list(index_stamp) if index_stamp else None):
+            return False
+
+        config_file = artifact_name("config", snapshot.hash)
+        _write_artifact(config_file, snapshot)
+        sections = {}
+        for name, section in snapshot.sections.items():
+            sections[name] = artifact_name(name, section.hash)
+            _write_artifact(sections[name], section)
+
+        if index_stamp is not None:
+            with open(INDEX_FILE, encoding="utf-8") as f:
+                page = f.read()
+            atomic_write(INDEX_FILE, render_index(page, inline_script(snapshot, config_file)).encode("utf-8"))
+            index_stamp = _stamp(INDEX_FILE)
+            precompress_file(INDEX_FILE)
+
+        manifest = {
+            "version": snapshot.version,
+            "etag": snapshot.etag,
+            "config": config_file,
+            "sections": sections,
+            "index_stamp": list(index_stamp) if index_stamp else None,
+            "published": datetime.now().isoformat(timespec="seconds"),
+        }
+        atomic_write(MANIFEST_FILE, json.dumps(manifest, indent=2).encode("utf-8"))
+        _prune({config_file, *sections.values()})
+    return True
+
+
+class Publisher:
+    """Republishes in the background whenever ``ConfigManager`` reports a change,
+    and every ``interval`` seconds in case index.html was rebuilt."""
+
+    def __init__(self, interval: float = PUBLISH_CHECK_INTERVAL):
+        self.interval = interval
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._unsubscribe = None
+        self.published = 0
+        self.failed = 0
+        self.last_version: Optional[int] = None
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._unsubscribe = ConfigManager.subscribe(self._on_change)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._unsubscribe()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def _on_change(self, changed: Dict[str, Optional[int]], snapshot: ConfigSnapshot) -> None:
+        # Called in whichever thread swapped the snapshot; the writing happens in _run
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                snapshot = await asyncio.to_thread(ConfigManager.snapshot)
+                if await asyncio.to_thread(publish, snapshot):
+                    self.published += 1
+                    self.last_version = snapshot.version
+            except Exception as e:
+                self.failed += 1
+                print(f"Error publishing config: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "published": self.published,
+            "failed": self.failed,
+            "last_version": self.last_version,
+        }
+
+
+publisher = Publisher()
+
+
+def main():
+    print("Published" if publish() else "Already up to date", _read_manifest().get("config"))
+
+
+if __name__ == "__main__":
+    main()
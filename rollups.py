@@ -0,0 +1,201 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import distinct, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models import Entry, VisitDailyIp, VisitIp, VisitRollup
+
+# Daily rollups are broken down by these dimensions; hourly ones only keep totals
+BREAKDOWNS = ("device", "browser", "country")
+# How many recent days the periodic compaction job recomputes from raw entries
+COMPACT_DAYS = 2
+# Bucket of the single period="total" rollup row holding the all-time views and unique IPs
+TOTAL_BUCKET = datetime(2000, 1, 1)
+
+
+def hour_start(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def visit_dimensions(device_family: Optional[str], browser_family: Optional[str], country: Optional[str]) -> Dict[str, str]:
+    return {
+        "device": device_family or "Other",
+        "browser": browser_family or "Other",
+        "country": country or "Unknown",
+    }
+
+
+def _bump(db: Session, period: str, bucket: datetime, dimension: str, value: str, views: int = 1, uniques: int = 0) -> None:
+    stmt = insert(VisitRollup).values(
+        period=period, bucket=bucket, dimension=dimension, value=value, views=views, uniques=uniques
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["period", "bucket", "dimension", "value"],
+        set_={"views": VisitRollup.views + stmt.excluded.views, "uniques": VisitRollup.uniques + stmt.excluded.uniques},
+    )
+    db.execute(stmt)
+
+
+def record_visit(db: Session, created: datetime, ip_address: Optional[str], dimensions: Dict[str, str]) -> None:
+    """Add one visit to the rollups. Runs in the caller's transaction, next to the Entry insert."""
+    record_visits(db, [(created, ip_address, dimensions)])
+
+
+def record_visits(db: Session, visits: Iterable[Tuple[datetime, Optional[str], Dict[str, str]]]) -> None:
+    """Add a batch of (created, ip_address, dimensions) visits with one upsert per distinct rollup row."""
+    hours: Counter = Counter()
+    days: Counter = Counter()
+    ips: Dict[datetime, set] = defaultdict(set)
+    for created, ip_address, dimensions in visits:
+        day = day_start(created)
+        hours[hour_start(created)] += 1
+        days[(day, "all", "")] += 1
+        for dimension in BREAKDOWNS:
+            days[(day, dimension, dimensions[dimension])] += 1
+        if ip_address:
+            ips[day].add(ip_address)
+
+    new_ips: Counter = Counter()
+    first_seen: Dict[str, date] = {}
+    for day in sorted(ips):
+        for ip in ips[day]:
+            first_seen.setdefault(ip, day.date())
+    for day, addresses in ips.items():
+        # Core executemany on the session's connection: its rowcount is the number of IPs new today
+        result = db.connection().execute(
+            insert(VisitDailyIp).on_conflict_do_nothing(),
+            [{"day": day.date(), "ip_address": ip} for ip in addresses],
+        )
+        new_ips[day] = result.rowcount
+    new_all_time = 0
+    if first_seen:
+        # Same trick: the rowcount is the number of IPs never seen before
+        new_all_time = db.connection().execute(
+            insert(VisitIp).on_conflict_do_nothing(),
+            [{"ip_address": ip, "first_seen": day} for ip, day in first_seen.items()],
+        ).rowcount
+    for bucket, views in hours.items():
+        _bump(db, "hour", bucket, "all", "", views=views)
+    for (day, dimension, value), views in days.items():
+        _bump(db, "day", day, dimension, value, views=views, uniques=new_ips[day] if dimension == "all" else 0)
+    if hours:
+        _bump(db, "total", TOTAL_BUCKET, "all", "", views=sum(hours.values()), uniques=new_all_time)
+
+
+def reconcile_day(db: Session, day: date) -> None:
+    """Recompute every rollup row for one day from the raw entries."""
+    start = datetime.combine(day, time.min)
+    end = start + timedelta(days=1)
+    db.query(VisitRollup).filter(VisitRollup.bucket >= start, VisitRollup.bucket < end).delete()
+    db.query(VisitDailyIp).filter(VisitDailyIp.day == day).delete()
+
+    hours: Counter = Counter()
+    breakdowns: Counter = Counter()
+    ips = set()
+    views = 0
+    rows = db.query(Entry.created, Entry.ip_address, Entry.device_family, Entry.browser_family, Entry.country).filter(
+        Entry.created >= start, Entry.created < end
+    ).yield_per(1000)
+    for created, ip_address, device_family, browser_family, country in rows:
+        views += 1
+        hours[hour_start(created)] += 1
+        for dimension, value in visit_dimensions(device_family, browser_family, country).items():
+            breakdowns[(dimension, value)] += 1
+        if ip_address:
+            ips.add(ip_address)
+
+    if not views:
+        return
+    db.add(VisitRollup(period="day", bucket=start, dimension="all", value="", views=views, uniques=len(ips)))
+    db.add_all(VisitRollup(period="hour", bucket=h, dimension="all", value="", views=n, uniques=0) for h, n in hours.items())
+    db.add_all(
+        VisitRollup(period="day", bucket=start, dimension=dimension, value=value, views=n, uniques=0)
+        for (dimension, value), n in breakdowns.items()
+    )
+    db.add_all(VisitDailyIp(day=day, ip_address=ip) for ip in ips)
+    if ips:
+        stmt = insert(VisitIp)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["ip_address"], set_={"first_seen": func.min(VisitIp.first_seen, stmt.excluded.first_seen)}
+        )
+        db.connection().execute(stmt, [{"ip_address": ip, "first_seen": day} for ip in ips])
+
+
+def reconcile_total(db: Session) -> None:
+    """Recompute the all-time row from the daily rows and visit_ips, in one statement."""
+    views = db.query(func.coalesce(func.sum(VisitRollup.views), 0)).filter(
+        VisitRollup.period == "day", VisitRollup.dimension == "all"
+    ).scalar_subquery()
+    uniques = db.query(func.count()).select_from(VisitIp).scalar_subquery()
+    stmt = insert(VisitRollup).values(period="total", bucket=TOTAL_BUCKET, dimension="all", value="", views=views, uniques=uniques)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["period", "bucket", "dimension", "value"],
+        set_={"views": stmt.excluded.views, "uniques": stmt.excluded.uniques},
+    ))
+
+
+def compact(db: Session, days: Optional[int] = COMPACT_DAYS) -> int:
+    """Reconcile the last ``days`` days (all history when None); returns the number of days rebuilt."""
+    today = date.today()
+    if days is None:
+        first = db.query(func.min(Entry.created)).scalar()
+        if first is None:
+            return 0
+        start = first.date()
+        # Rebuilt below from the entries that still exist
+        db.query(VisitIp).delete()
+    else:
+        start = today - timedelta(days=days - 1)
+    rebuilt = 0
+    day = start
+    while day <= today:
+        reconcile_day(db, day)
+        db.commit()
+        rebuilt += 1
+        day += timedelta(days=1)
+    reconcile_total(db)
+    db.commit()
+    return rebuilt
+
+
+def summary(db: Session, since: Optional[datetime] = None) -> Dict[str, int]:
+    """Page views and unique IPs since a day boundary (all time when None)."""
+    if since is None:
+        # One row, kept up to date by record_visits and compact
+        total = db.query(VisitRollup.views, VisitRollup.uniques).filter(
+            VisitRollup.period == "total", VisitRollup.bucket == TOTAL_BUCKET
+        ).first()
+        return {"views": total.views, "unique": total.uniques} if total else {"views": 0, "unique": 0}
+    views = db.query(func.coalesce(func.sum(VisitRollup.views), 0)).filter(
+        VisitRollup.period == "day", VisitRollup.dimension == "all", VisitRollup.bucket >= day_start(since)
+    )
+    unique = db.query(func.count(distinct(VisitDailyIp.ip_address))).filter(VisitDailyIp.day >= since.date())
+    return {"views": views.scalar(), "unique": unique.scalar()}
+
+
+def breakdown(db: Session, dimension: str, since: datetime, limit: int = 10) -> List[Dict[str, Any]]:
+    rows = db.query(VisitRollup.value, func.sum(VisitRollup.views).label("views")).filter(
+        VisitRollup.period == "day",
+        VisitRollup.dimension == dimension,
+        VisitRollup.bucket >= day_start(since),
+    ).group_by(VisitRollup.value).order_by(func.sum(VisitRollup.views).desc()).limit(limit).all()
+    return [{"value": value, "views": views} for value, views in rows]
+
+
+def series(db: Session, period: str, since: datetime) -> List[Dict[str, Any]]:
+    rows = db.query(VisitRollup.bucket, VisitRollup.views, VisitRollup.uniques).filter(
+        VisitRollup.period == period,
+        VisitRollup.dimension == "all",
+        VisitRollup.bucket >= (hour_start(since) if period == "hour" else day_start(since)),
+    ).order_by(VisitRollup.bucket).all()
+    if period == "hour":
+        # Unique IPs are only tracked per day
+        return [{"bucket": bucket.isoformat(), "views": views} for bucket, views, _ in rows]
+    return [{"bucket": bucket.isoformat(), "views": views, "unique": uniques} for bucket, views, uniques in rows]
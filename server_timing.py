@@ -0,0 +1,40 @@
+import time
+from typing import Optional
+
+from starlette.requests import Request
+
+
+def record(request: Request, name: str, duration: float, description: Optional[str] = None) -> None:
+    """Add a metric (``duration`` in seconds) to the response's Server-Timing header."""
+    desc = f';desc="{description}"' if description else ""
+    timings = getattr(request.state, "server_timing", None)
+    if timings is not None:
+        timings.append(f"{name}{desc};dur={duration * 1000:.2f}")
+
+
+class ServerTimingMiddleware:
+    """Adds a Server-Timing header with the time to the first response byte (``app``)
+    plus whatever handlers passed to ``record()``. Visible in the browser's network panel.
+
+    Plain ASGI rather than BaseHTTPMiddleware, so it costs next to nothing per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        timings = scope.setdefault("state", {}).setdefault("server_timing", [])
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                metrics = [f"app;dur={(time.perf_counter() - start) * 1000:.2f}", *timings]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(metrics).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
@@ -0,0 +1,237 @@
+"""Static file serving with precompressed variants and cache headers.
+
+    python static_files.py front-app/dist admin-app/dist
+
+Writes ``.gz`` and ``.br`` files next to the compressible files of a build, as
+both services also do for their own ``dist`` on startup. ``CachedStaticFiles``
+serves them to clients that accept the encoding.
+"""
+import asyncio
+import gzip
+import hashlib
+import os
+import sys
+import time
+from email.utils import formatdate
+from mimetypes import guess_type
+from typing import Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from config_manager import atomic_write
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# For file names that change with their content (Vite assets, published config artifacts)
+IMMUTABLE = "public, max-age=31536000, immutable"
+# For files replaced under the same name; the ETag makes revalidation a cheap 304
+REVALIDATE = "no-cache"
+# Text formats worth compressing; images and fonts already are
+COMPRESSIBLE_EXTENSIONS = {".js", ".mjs", ".css", ".html", ".svg", ".json", ".map", ".txt", ".xml", ".webmanifest"}
+# Smaller files gain nothing from compression
+MIN_COMPRESS_SIZE = 1024
+# Preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# How often (seconds) a manifest rescans its directory for added, replaced or removed files
+MANIFEST_RESCAN_INTERVAL = 5.0
+
+
+def _is_fresh(variant: str, source: str) -> bool:
+    try:
+        return os.path.getmtime(variant) >= os.path.getmtime(source)
+    except FileNotFoundError:
+        return False
+
+
+def precompress_file(path: str) -> int:
+    """Write the missing or outdated compressed variants of one file; returns how many were written."""
+    written = 0
+    data = None
+    for encoding, suffix in ENCODINGS:
+        if encoding == "br" and brotli is None:
+            continue
+        if _is_fresh(path + suffix, path):
+            continue
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        body = brotli.compress(data) if encoding == "br" else gzip.compress(data, compresslevel=9, mtime=0)
+        if len(body) >= len(data):
+            continue
+        atomic_write(path + suffix, body)
+        written += 1
+    return written
+
+
+def precompress(directory: str, min_size: int = MIN_COMPRESS_SIZE) -> int:
+    """Precompress every compressible file under ``directory``; returns how many variants were written."""
+    written = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            try:
+                if os.path.getsize(path) >= min_size:
+                    written += precompress_file(path)
+            except OSError as e:
+                print(f"Error precompressing {path}: {e}")
+    return written
+
+
+class _Listing(NamedTuple):
+    files: Dict[str, FrozenSet[str]]
+    stats: Dict[str, os.stat_result]
+    bodies: Dict[str, bytes]
+
+    def negotiate(self, path: str, accept_encoding: str) -> Optional[str]:
+        """The best precompressed variant of ``path`` the client accepts, if any"""
+        available = self.files.get(path)
+        if not available:
+            return None
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        for encoding, _ in ENCODINGS:
+            if encoding in available and encoding in accepted:
+                return encoding
+        return None
+
+
+class StaticManifest:
+    """In-memory listing of the files under a directory: their stat results, up-to-date
+    compressed variants and, for the ``preload`` files, their contents.
+
+    Rescanned in a worker thread at most every ``rescan_interval`` seconds;
+    requests in between are answered from the previous scan, so looking a
+    path up neither touches the filesystem nor blocks the event loop.
+    """
+
+    def __init__(self, directory: str, rescan_interval: float = MANIFEST_RESCAN_INTERVAL, preload: Tuple[str, ...] = ("index.html",)):
+        self.directory = directory
+        self.rescan_interval = rescan_interval
+        self.preload = set(preload)
+        self._listing = _Listing({}, {}, {})
+        self._scanned: Optional[float] = None
+        self._refresh: Optional[asyncio.Task] = None
+
+    def _scan(self) -> _Listing:
+        stats: Dict[str, os.stat_result] = {}
+        bodies: Dict[str, bytes] = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, self.directory)
+                try:
+                    if relative.removesuffix(".br").removesuffix(".gz") in self.preload:
+                        # Stat and contents of the same file, even if it is replaced meanwhile
+                        with open(path, "rb") as f:
+                            stats[relative] = os.fstat(f.fileno())
+                            bodies[relative] = f.read()
+                    else:
+                        stats[relative] = os.stat(path)
+                except FileNotFoundError:
+                    continue
+        files = {
+            path: frozenset(
+                encoding for encoding, suffix in ENCODINGS
+                if path + suffix in stats and stats[path + suffix].st_mtime >= stat_result.st_mtime
+            )
+            for path, stat_result in stats.items()
+        }
+        return _Listing(files, stats, bodies)
+
+    async def _rescan(self) -> None:
+        try:
+            self._listing = await asyncio.to_thread(self._scan)
+        except OSError as e:
+            print(f"Error scanning {self.directory}: {e}")
+        self._scanned = time.monotonic()
+
+    async def listing(self) -> _Listing:
+        """The current listing; only the first call waits for a scan."""
+        if self._scanned is None or time.monotonic() - self._scanned >= self.rescan_interval:
+            loop = asyncio.get_running_loop()
+            if self._refresh is None or self._refresh.done() or self._refresh.get_loop() is not loop:
+                self._refresh = loop.create_task(self._rescan())
+            if self._scanned is None:
+                await asyncio.shield(self._refresh)
+        return self._listing
+
+
+def _stat_headers(stat_result: os.stat_result) -> Dict[str, str]:
+    """The validators FileResponse derives from a stat result, so both kinds of response revalidate alike."""
+    etag_base = f"{stat_result.st_mtime}-{stat_result.st_size}"
+    return {
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "ETag": f'"{hashlib.md5(etag_base.encode(), usedforsecurity=False).hexdigest()}"',
+    }
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that sends ``cache_control`` with every file and, with
+    ``precompressed``, serves a file's ``.br``/``.gz`` sibling to clients that accept it.
+    The manifest's preloaded files (index.html) are answered from memory."""
+
+    def __init__(self, *, directory: str, cache_control: str = REVALIDATE, precompressed: bool = True, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.cache_control = cache_control
+        self.manifest = StaticManifest(directory) if precompressed else None
+
+    async def get_response(self, path: str, scope):
+        if self.manifest is not None and scope["method"] in ("GET", "HEAD"):
+            listing = await self.manifest.listing()
+            encoding = listing.negotiate(path, Headers(scope=scope).get("accept-encoding", ""))
+            name = path + dict(ENCODINGS)[encoding] if encoding is not None else path
+            if name in listing.bodies:
+                return self.memory_response(path, listing.bodies[name], listing.stats[name], scope, encoding)
+            if encoding is not None:
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, name)
+                if stat_result is not None:
+                    return self.file_response(full_path, stat_result, scope, encoding=encoding)
+        return await super().get_response(path, scope)
+
+    def _headers(self, name: str, encoding: Optional[str]) -> Dict[str, str]:
+        headers = {"Cache-Control": self.cache_control}
+        if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return headers
+
+    def memory_response(self, path: str, body: bytes, stat_result: os.stat_result, scope, encoding: Optional[str] = None):
+        """``path`` (or its ``encoding`` variant) from the manifest's copy of its contents."""
+        headers = {**self._headers(path, encoding), **_stat_headers(stat_result)}
+        response = Response(body, headers=headers, media_type=guess_type(path)[0])
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200, encoding: Optional[str] = None):
+        name = str(full_path)
+        if encoding is not None:
+            name = name[: -len(dict(ENCODINGS)[encoding])]
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers=self._headers(name, encoding),
+            media_type=guess_type(name)[0] if encoding is not None else None,
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def main():
+    for directory in sys.argv[1:] or ["front-app/dist", "admin-app/dist"]:
+        if os.path.isdir(directory):
+            print(f"{directory}: {precompress(directory)} files written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Visit fields from the user agent and the client's device info.
+
+    python visits.py --iterations 20000
+
+Times ``parse_user_agent`` cold (every call runs ua-parser) against cached
+(LRU hits) over a sample of common user agents.
+"""
+import argparse
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import user_agents
+
+# Substrings (lower-case) that mark a user agent as automated traffic
+BOT_KEYWORDS = ("bot", "crawler", "spider", "headless", "phantomjs", "selenium", "puppeteer", "playwright")
+# Distinct user agents kept parsed in memory; real traffic only has a few hundred
+UA_CACHE_SIZE = 2048
+
+
+# Common desktop, mobile and crawler user agents for the benchmark in main()
+SAMPLE_USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/24.0 Chrome/117.0.0.0 Mobile Safari/537.36",
+)
+
+
+class UserAgentInfo(NamedTuple):
+    device_family: str
+    device_brand: Optional[str]
+    device_model: Optional[str]
+    os_family: str
+    os_version: str
+    browser_family: str
+    browser_version: str
+
+
+def is_bot(user_agent_str: Optional[str]) -> bool:
+    ua = (user_agent_str or "").lower()
+    return any(k in ua for k in BOT_KEYWORDS)
+
+
+@lru_cache(maxsize=UA_CACHE_SIZE)
+def parse_user_agent(user_agent_str: str) -> UserAgentInfo:
+    """Parse a user agent string; memoized because ua-parser's regexes dominate visit CPU cost."""
+    ua = user_agents.parse(user_agent_str or "")
+    return UserAgentInfo(
+        device_family=ua.device.family,
+        device_brand=ua.device.brand,
+        device_model=ua.device.model,
+        os_family=ua.os.family,
+        os_version=ua.os.version_string,
+        browser_family=ua.browser.family,
+        browser_version=ua.browser.version_string,
+    )
+
+
+def user_agent_cache_stats() -> Dict[str, int]:
+    info = parse_user_agent.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+def _int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def client_fields(device_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Typed display/system columns from a /api/device-info payload.
+
+    Accepts both the nested shape ({"screen": {"width": ...}, "viewport": ...})
+    and the flat one the front SPA posts ({"screen_width": ..., ...}).
+    """
+    if not device_info:
+        return {}
+    screen = device_info.get("screen") if isinstance(device_info.get("screen"), dict) else {}
+    viewport = device_info.get("viewport") if isinstance(device_info.get("viewport"), dict) else {}
+    language = device_info.get("language")
+    return {
+        "screen_width": _int(screen.get("width", device_info.get("screen_width"))),
+        "screen_height": _int(screen.get("height", device_info.get("screen_height"))),
+        "viewport_width": _int(viewport.get("width", device_info.get("viewport_width"))),
+        "viewport_height": _int(viewport.get("height", device_info.get("viewport_height"))),
+        "pixel_ratio": _float(screen.get("pixelRatio", device_info.get("pixel_ratio"))),
+        "language": str(language)[:64] if language else None,
+        "device_memory": _float(device_info.get("deviceMemory", device_info.get("device_memory"))),
+        "cpu_cores": _int(device_info.get("hardwareConcurrency", device_info.get("cpu_cores"))),
+    }
+
+
+def entry_fields(user_agent_str: str, device_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Column values for an Entry built from the raw user agent and client device info."""
+    return {
+        "user_agent": user_agent_str,
+        "is_bot": is_bot(user_agent_str),
+        **parse_user_agent(user_agent_str)._asdict(),
+        **client_fields(device_info),
+    }
+
+
+def describe(fields: Dict[str, Any], device_info: Optional[Dict[str, Any]] = None) -> Tuple[str, str, str, str, List[str]]:
+    """Human-readable device, OS, browser, display and system lines for notifications."""
+    device_str = f"📱 Device: {fields.get('device_family')}"
+    if fields.get("device_brand") and fields.get("device_model"):
+        device_str += f" ({fields['device_brand']} {fields['device_model']})"
+    os_str = f"💻 OS: {fields.get('os_family')} {fields.get('os_version') or ''}".rstrip()
+    browser_str = f"🌐 Browser: {fields.get('browser_family')} {fields.get('browser_version') or ''}".rstrip()
+
+    device_info = device_info or {}
+    screen = device_info.get("screen") if isinstance(device_info.get("screen"), dict) else {}
+    resolution_parts = []
+    if fields.get("screen_width") and fields.get("screen_height"):
+        resolution_parts.append(f"📺 Physical: {fields['screen_width']}x{fields['screen_height']}")
+    if screen.get("availWidth") and screen.get("availHeight"):
+        resolution_parts.append(f"🖥️ Available: {screen['availWidth']}x{screen['availHeight']}")
+    if fields.get("viewport_width") and fields.get("viewport_height"):
+        resolution_parts.append(f"🔍 Viewport: {fields['viewport_width']}x{fields['viewport_height']}")
+    if fields.get("pixel_ratio"):
+        resolution_parts.append(f"📊 Pixel Ratio: {fields['pixel_ratio']}")
+    if isinstance(screen.get("orientation"), dict):
+        orientation = screen["orientation"]
+        resolution_parts.append(f"📱 Orientation: {orientation.get('type', 'unknown')} ({orientation.get('angle', '0')}°)")
+    resolution_str = "\n".join(resolution_parts) if resolution_parts else "📊 Resolution: Unknown"
+
+    additional_info = []
+    if device_info.get("username") and device_info["username"] != "Unknown":
+        additional_info.append(f"👤 Username: {device_info['username']}")
+    if fields.get("language"):
+        additional_info.append(f"🌍 Language: {fields['language']}")
+    if fields.get("device_memory"):
+        additional_info.append(f"💾 Memory: {fields['device_memory']:g}GB")
+    if fields.get("cpu_cores"):
+        additional_info.append(f"⚡ CPU Cores: {fields['cpu_cores']}")
+    if isinstance(device_info.get("connection"), dict):
+        conn = device_info["connection"]
+        if conn.get("type"):
+            additional_info.append(f"📡 Network: {conn['type']}")
+        if conn.get("downlink"):
+            additional_info.append(f"⬇️ Speed: {conn['downlink']} Mbps")
+    if isinstance(device_info.get("platformDetails"), dict):
+        pd = device_info["platformDetails"]
+        if pd.get("platform") and pd.get("platformVersion"):
+            additional_info.append(f"🖥️ Platform: {pd['platform']} {pd['platformVersion']}")
+        if pd.get("architecture"):
+            additional_info.append(f"🔧 Architecture: {pd['architecture']}")
+
+    return device_str, os_str, browser_str, resolution_str, additional_info
+
+
+def _time_per_call(user_agent_strs: List[str]) -> float:
+    start = time.perf_counter()
+    for user_agent_str in user_agent_strs:
+        parse_user_agent(user_agent_str)
+    return (time.perf_counter() - start) / len(user_agent_strs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time user agent parsing with and without the LRU cache")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    samples = [SAMPLE_USER_AGENTS[i % len(SAMPLE_USER_AGENTS)] for i in range(args.iterations)]
+    # A distinct string per call misses this cache and ua-parser's own: what every visit cost before the LRU
+    cold = _time_per_call([f"{ua} bench/{i}" for i, ua in enumerate(samples)])
+    parse_user_agent.cache_clear()
+    cached = _time_per_call(samples)
+    print(f"cold   {cold * 1e6:8.1f} us/call")
+    print(f"cached {cached * 1e6:8.1f} us/call  ({cold / cached:.0f}x, {user_agent_cache_stats()})")
+
+
+if __name__ == "__main__":
+    main()
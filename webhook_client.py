@@ -0,0 +1,114 @@
+import asyncio
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TIMEOUT = 5
+MAX_ATTEMPTS = 4
+# Exponential backoff: 0.5s, 1s, 2s, ... capped, plus up to BACKOFF_BASE of jitter
+BACKOFF_BASE = 0.5
+MAX_BACKOFF = 30.0
+# Kept-alive connections per host (Discord, Slack, Teams, ...)
+POOL_SIZE = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class DeliveryResult(NamedTuple):
+    url: str
+    ok: bool
+    status_code: Optional[int]
+    attempts: int
+    error: Optional[str] = None
+    # Server-requested wait before the next try (429), if any
+    retry_after: Optional[float] = None
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Shared session so every delivery reuses pooled keep-alive connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Content-Type": "application/json"})
+            _session = session
+        return _session
+
+
+def close() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _backoff(attempt: int) -> float:
+    return min(BACKOFF_BASE * 2 ** (attempt - 1), MAX_BACKOFF) + random.uniform(0, BACKOFF_BASE)
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    """Seconds to wait from a rate-limited response.
+
+    Slack sends a ``Retry-After`` header (seconds); Discord sends the header
+    and a JSON body with ``retry_after`` (seconds, possibly fractional).
+    """
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(float(header), 0.0)
+        except ValueError:
+            try:
+                return max((parsedate_to_datetime(header) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    try:
+        value = response.json().get("retry_after")
+        return max(float(value), 0.0) if value is not None else None
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+def _post(url: str, payload: Dict[str, Any]) -> requests.Response:
+    return get_session().post(url, json=payload, timeout=TIMEOUT)
+
+
+async def deliver(url: str, payload: Dict[str, Any], attempts: int = MAX_ATTEMPTS) -> DeliveryResult:
+    """POST one payload, retrying transport errors, 5xx and 429 with backoff."""
+    status_code = None
+    error = None
+    wait = None
+    for attempt in range(1, attempts + 1):
+        try:
+            r = await asyncio.to_thread(_post, url, payload)
+        except requests.RequestException as e:
+            status_code, error, wait = None, str(e), None
+            delay = _backoff(attempt)
+        else:
+            status_code = r.status_code
+            if 200 <= status_code < 300:
+                return DeliveryResult(url, True, status_code, attempt)
+            error = f"Webhook returned {status_code}: {r.text[:500]}"
+            if status_code not in RETRY_STATUSES:
+                return DeliveryResult(url, False, status_code, attempt, error)
+            wait = retry_after(r) if status_code == 429 else None
+            delay = wait or _backoff(attempt)
+        if attempt < attempts:
+            await asyncio.sleep(min(delay, MAX_BACKOFF))
+    return DeliveryResult(url, False, status_code, attempts, error, wait)
+
+
+async def deliver_all(deliveries: Iterable[Tuple[str, Dict[str, Any]]], attempts: int = MAX_ATTEMPTS) -> List[DeliveryResult]:
+    """Send every (url, payload) pair concurrently."""
+    return list(await asyncio.gather(*(deliver(url, payload, attempts) for url, payload in deliveries)))
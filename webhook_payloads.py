@@ -0,0 +1,261 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# URL substrings identifying each chat platform; anything else gets the generic JSON body
+PLATFORM_PATTERNS = (
+    ("discord", ("discord.com/api/webhooks",)),
+    ("slack", ("hooks.slack.com",)),
+    ("teams", ("webhook.office.com", "office365.com")),
+)
+PLATFORMS = ("discord", "slack", "teams", "generic")
+EVENTS = ("message", "visitor", "visitor_digest")
+
+Renderer = Callable[[Dict[str, Any]], Dict[str, Any]]
+_registry: Dict[Tuple[str, str], Renderer] = {}
+
+# Skeleton parts shared by every payload. They are never mutated: payloads are
+# serialized straight away (outbox row or HTTP body), so sharing is safe.
+MAP_URL = "https://static-maps.yandex.ru/1.x/?ll={lon},{lat}&size={size}&z=11&l=map&pt={lon},{lat},pm2rdm1&lang=en".format
+DISCORD_CONTACT_FOOTER = {"text": "Portfolio Contact Form • Powered by IP-API"}
+DISCORD_SITE_FOOTER = {"text": "Portfolio Website • Powered by IP-API"}
+SLACK_MESSAGE_HEADER_TEXT = {"type": "plain_text", "emoji": True}
+SLACK_VISIT_HEADER = {"type": "header", "text": {"type": "plain_text", "text": "🔔 New Website Visit", "emoji": True}}
+SLACK_DIGEST_HEADER = {"type": "header", "text": {"type": "plain_text", "text": "📊 Visitor Digest", "emoji": True}}
+SLACK_MAP_TITLE = {"type": "plain_text", "text": "Location Map", "emoji": True}
+TEAMS_CARD = {"@type": "MessageCard", "@context": "http://schema.org/extensions", "themeColor": "0078D7"}
+
+
+def detect_platform(url: str) -> str:
+    """Platform of a webhook URL; resolved once when the webhook is saved."""
+    url_lower = url.lower()
+    for platform, patterns in PLATFORM_PATTERNS:
+        if any(p in url_lower for p in patterns):
+            return platform
+    return "generic"
+
+
+def register(platform: str, event: str):
+    """Decorator adding a renderer for one (platform, event) pair."""
+    def decorator(func: Renderer) -> Renderer:
+        _registry[(platform, event)] = func
+        return func
+    return decorator
+
+
+def render(platform: Optional[str], event: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the payload for an event; unknown platforms fall back to the generic renderer."""
+    renderer = _registry.get((platform, event)) or _registry[("generic", event)]
+    return renderer(context)
+
+
+def _location_str(location: Dict[str, Any]) -> str:
+    # Region is unknown for some IPs, and a local address has only a country and city
+    return ", ".join(str(location[key]) for key in ("city", "region", "country") if location.get(key))
+
+
+def _has_map(location: Dict[str, Any]) -> bool:
+    return location.get("lat") is not None and location.get("lon") is not None
+
+
+def _generic_location(location: Dict[str, Any]) -> Dict[str, Any]:
+    return {"city": location.get("city"), "region": location.get("region"), "country": location.get("country"), "coordinates": {"lat": location.get("lat"), "lon": location.get("lon")}}
+
+
+def _top(counts: Dict[str, int]) -> str:
+    return "\n".join(f"{value}: {n}" for value, n in counts.items()) or "None"
+
+
+def _digest_headline(summary: Dict[str, Any]) -> str:
+    start = datetime.fromisoformat(summary["start"])
+    end = datetime.fromisoformat(summary["end"])
+    headline = f"{summary['visits']} visits from {summary['unique_ips']} IPs between {start.strftime('%H:%M:%S')} and {end.strftime('%H:%M:%S')}"
+    if summary["repeat_visits"]:
+        headline += f" ({summary['repeat_visits']} repeat visits not counted)"
+    return headline
+
+
+# --- message: name, email, subject, message, ip_address, location, timestamp ---
+
+@register("discord", "message")
+def discord_message(c: Dict[str, Any]) -> Dict[str, Any]:
+    location = c["location"]
+    fields = [
+        {"name": "📧  Email", "value": f"```{c['email']}```", "inline": True},
+        {"name": "📝  Subject", "value": f"```fix\n{c['subject']}```", "inline": True},
+        {"name": "💬  Message", "value": f"```fix\n{c['message']}```"},
+        {"name": "🌐  IP Address", "value": f"```yaml\n{c['ip_address']}```", "inline": True},
+    ]
+    embed = {"title": f"📨  New Message from {c['name']}", "color": 16776960, "fields": fields, "footer": DISCORD_CONTACT_FOOTER, "timestamp": c["timestamp"].isoformat()}
+    if location:
+        fields.append({"name": "📍  Location", "value": f"```yaml\n{_location_str(location)}```", "inline": True})
+        if _has_map(location):
+            embed["image"] = {"url": MAP_URL(lon=location["lon"], lat=location["lat"], size="650,400")}
+    return {"embeds": [embed]}
+
+
+@register("slack", "message")
+def slack_message(c: Dict[str, Any]) -> Dict[str, Any]:
+    location = c["location"]
+    blocks = [
+        {"type": "header", "text": {**SLACK_MESSAGE_HEADER_TEXT, "text": f"📨 New Message from {c['name']}"}},
+        {"type": "section", "fields": [{"type": "mrkdwn", "text": f"*Email:*\n{c['email']}"}, {"type": "mrkdwn", "text": f"*Subject:*\n{c['subject']}"}]},
+        {"type": "section", "text": {"type": "mrkdwn", "text": f"*Message:*\n>{c['message']}"}},
+    ]
+    if location:
+        blocks.append({"type": "section", "fields": [{"type": "mrkdwn", "text": f"*IP Address:*\n{c['ip_address']}"}, {"type": "mrkdwn", "text": f"*Location:*\n{_location_str(location)}"}]})
+        if _has_map(location):
+            blocks.append({"type": "image", "title": SLACK_MAP_TITLE, "image_url": MAP_URL(lon=location["lon"], lat=location["lat"], size="600,300"), "alt_text": "Map showing visitor location"})
+    else:
+        blocks.append({"type": "section", "fields": [{"type": "mrkdwn", "text": f"*IP Address:*\n{c['ip_address']}"}]})
+    blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": f"Sent at: {c['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}"}]})
+    return {"blocks": blocks}
+
+
+@register("teams", "message")
+def teams_message(c: Dict[str, Any]) -> Dict[str, Any]:
+    facts = [{"name": "Email", "value": c["email"]}, {"name": "Subject", "value": c["subject"]}, {"name": "IP Address", "value": c["ip_address"]}]
+    if c["location"]:
+        facts.append({"name": "Location", "value": _location_str(c["location"])})
+    return {**TEAMS_CARD, "summary": f"New message from {c['name']}", "sections": [{"activityTitle": f"📨 New Message from {c['name']}", "facts": facts, "text": c["message"]}]}
+
+
+@register("generic", "message")
+def generic_message(c: Dict[str, Any]) -> Dict[str, Any]:
+    data = {"timestamp": c["timestamp"].isoformat(), "fullname": c["name"], "email": c["email"], "subject": c["subject"], "message": c["message"], "ip_address": c["ip_address"]}
+    if c["location"]:
+        data["location"] = _generic_location(c["location"])
+    return {"event": "message", "data": data}
+
+
+# --- visitor: id, ip_address, location, device, os, browser, display, additional, timestamp ---
+
+@register("discord", "visitor")
+def discord_visitor(c: Dict[str, Any]) -> Dict[str, Any]:
+    location = c["location"]
+    fields = [
+        {"name": "Device Information", "value": f"```yaml\n{c['device']}\n{c['os']}\n{c['browser']}```", "inline": False},
+        {"name": "Display", "value": f"```yaml\n{c['display']}```", "inline": False},
+    ]
+    if c["additional"]:
+        fields.append({"name": "System Info", "value": "```yaml\n" + "\n".join(c["additional"]) + "```", "inline": False})
+    fields.append({"name": "🔍  IP Address", "value": f"```yaml\n{c['ip_address']}```", "inline": True})
+    embed = {"title": "🔔  New Website Visit", "description": f"```Entry ID: {c['id']}```", "color": 5763719, "fields": fields, "footer": DISCORD_SITE_FOOTER, "timestamp": c["timestamp"].isoformat()}
+    if location:
+        fields.append({"name": "📍  Location", "value": f"```yaml\n{_location_str(location)}```", "inline": True})
+        if _has_map(location):
+            embed["image"] = {"url": MAP_URL(lon=location["lon"], lat=location["lat"], size="650,400")}
+    return {"embeds": [embed]}
+
+
+@register("slack", "visitor")
+def slack_visitor(c: Dict[str, Any]) -> Dict[str, Any]:
+    location = c["location"]
+    blocks = [
+        SLACK_VISIT_HEADER,
+        {"type": "section", "fields": [{"type": "mrkdwn", "text": f"*Device:*\n{c['device']}"}, {"type": "mrkdwn", "text": f"*OS:*\n{c['os']}"}]},
+        {"type": "section", "fields": [{"type": "mrkdwn", "text": f"*Browser:*\n{c['browser']}"}]},
+        {"type": "section", "text": {"type": "mrkdwn", "text": "*Display:*\n" + c["display"].replace("\n", ", ")}},
+    ]
+    if location:
+        blocks.append({"type": "section", "fields": [{"type": "mrkdwn", "text": f"*IP Address:*\n{c['ip_address']}"}, {"type": "mrkdwn", "text": f"*Location:*\n{_location_str(location)}"}]})
+        if _has_map(location):
+            blocks.append({"type": "image", "title": SLACK_MAP_TITLE, "image_url": MAP_URL(lon=location["lon"], lat=location["lat"], size="600,300"), "alt_text": "Map showing visitor location"})
+    else:
+        blocks.append({"type": "section", "fields": [{"type": "mrkdwn", "text": f"*IP Address:*\n{c['ip_address']}"}]})
+    blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": f"Visited at: {c['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}"}]})
+    return {"blocks": blocks}
+
+
+@register("teams", "visitor")
+def teams_visitor(c: Dict[str, Any]) -> Dict[str, Any]:
+    facts = [{"name": "Device", "value": c["device"]}, {"name": "OS", "value": c["os"]}, {"name": "Browser", "value": c["browser"]}, {"name": "IP Address", "value": c["ip_address"]}]
+    if c["location"]:
+        facts.append({"name": "Location", "value": _location_str(c["location"])})
+    return {**TEAMS_CARD, "summary": "New Website Visit", "sections": [{"activityTitle": "🔔 New Website Visit", "facts": facts, "text": "Display: " + c["display"].replace("\n", ", ")}]}
+
+
+@register("generic", "visitor")
+def generic_visitor(c: Dict[str, Any]) -> Dict[str, Any]:
+    data = {"id": str(c["id"]), "timestamp": c["timestamp"].isoformat(), "device_info": c["device"], "browser_info": c["browser"], "system_info": c["os"], "display_info": c["display"], "ip_address": c["ip_address"]}
+    if c["location"]:
+        data["location"] = _generic_location(c["location"])
+    return {"event": "visitor", "data": data}
+
+
+# --- visitor_digest: the summary dict from digest.VisitDigest ---
+
+@register("discord", "visitor_digest")
+def discord_digest(s: Dict[str, Any]) -> Dict[str, Any]:
+    fields = [
+        {"name": "📍  Countries", "value": f"```yaml\n{_top(s['countries'])}```", "inline": True},
+        {"name": "📱  Devices", "value": f"```yaml\n{_top(s['devices'])}```", "inline": True},
+        {"name": "🌐  Browsers", "value": f"```yaml\n{_top(s['browsers'])}```", "inline": True},
+    ]
+    return {"embeds": [{"title": "📊  Visitor Digest", "description": _digest_headline(s), "color": 5763719, "fields": fields, "footer": DISCORD_SITE_FOOTER, "timestamp": s["end"]}]}
+
+
+@register("slack", "visitor_digest")
+def slack_digest(s: Dict[str, Any]) -> Dict[str, Any]:
+    return {"blocks": [
+        SLACK_DIGEST_HEADER,
+        {"type": "section", "text": {"type": "mrkdwn", "text": _digest_headline(s)}},
+        {"type": "section", "fields": [
+            {"type": "mrkdwn", "text": f"*Countries:*\n{_top(s['countries'])}"},
+            {"type": "mrkdwn", "text": f"*Devices:*\n{_top(s['devices'])}"},
+            {"type": "mrkdwn", "text": f"*Browsers:*\n{_top(s['browsers'])}"},
+        ]},
+    ]}
+
+
+@register("teams", "visitor_digest")
+def teams_digest(s: Dict[str, Any]) -> Dict[str, Any]:
+    facts = [
+        {"name": "Countries", "value": _top(s["countries"]).replace("\n", ", ")},
+        {"name": "Devices", "value": _top(s["devices"]).replace("\n", ", ")},
+        {"name": "Browsers", "value": _top(s["browsers"]).replace("\n", ", ")},
+    ]
+    return {**TEAMS_CARD, "summary": "Visitor Digest", "sections": [{"activityTitle": "📊 Visitor Digest", "text": _digest_headline(s), "facts": facts}]}
+
+
+@register("generic", "visitor_digest")
+def generic_digest(s: Dict[str, Any]) -> Dict[str, Any]:
+    return {"event": "visitor_digest", "data": s}
+
+
+# Example contexts for the admin "test webhook" button and the benchmark
+SAMPLE_LOCATION = {"city": "Mountain View", "region": "California", "country": "United States", "lat": 37.422, "lon": -122.084}
+SAMPLES = {
+    "message": {
+        "name": "Test User", "email": "test@example.com", "subject": "Test message",
+        "message": "This is a test message.", "ip_address": "8.8.8.8", "location": SAMPLE_LOCATION,
+    },
+    "visitor": {
+        "id": "00000000-0000-0000-0000-000000000000", "ip_address": "8.8.8.8", "location": SAMPLE_LOCATION,
+        "device": "📱 Device: Test Device", "os": "💻 OS: Test OS", "browser": "🌐 Browser: Test Browser",
+        "display": "📺 Physical: 1920x1080\n🔍 Viewport: 1280x720", "additional": ["🌍 Language: en-US"],
+    },
+    "visitor_digest": {
+        "start": "2025-01-01T12:00:00", "end": "2025-01-01T12:05:00", "visits": 12, "unique_ips": 9, "repeat_visits": 3,
+        "countries": {"United States": 7, "France": 5}, "devices": {"Other": 10, "iPhone": 2}, "browsers": {"Chrome": 8, "Safari": 4},
+    },
+}
+
+
+def sample(event: str) -> Dict[str, Any]:
+    context = dict(SAMPLES[event])
+    if event != "visitor_digest":
+        context["timestamp"] = datetime.now()
+    return context
+
+
+if __name__ == "__main__":
+    # Rendering throughput per platform and event: python webhook_payloads.py
+    import json
+    import timeit
+
+    for event in EVENTS:
+        context = sample(event)
+        for platform in PLATFORMS:
+            n = 20000
+            seconds = timeit.timeit(lambda: json.dumps(render(platform, event, context)), number=n)
+            print(f"{event:15} {platform:8} {n / seconds:>10,.0f} payloads/s  {seconds / n * 1e6:6.1f} µs each (incl. JSON encoding)")
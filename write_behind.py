@@ -0,0 +1,320 @@
+import asyncio
+import fcntl
+import glob
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# What a crash (not a graceful shutdown, which always flushes) can lose:
+# MEMORY  - buffered items are lost with the process (at most one flush interval's worth)
+# SPOOL   - items are also appended to a per-process spool file (by a background thread,
+#           within milliseconds) and replayed on the next start; survives a killed
+#           process, not a power cut
+MEMORY = "memory"
+SPOOL = "spool"
+DURABILITY_MODES = (MEMORY, SPOOL)
+# Flushes an item may fail before it is given up on (counted as failed)
+MAX_ATTEMPTS = 5
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class _Segment:
+    """One spool file, locked for as long as its owner may still flush it.
+
+    ``append()`` only queues the item; ``write()`` and ``discard()`` do the
+    file I/O and run in the owner's spool thread, in the order they were scheduled.
+    The file is created on the first write.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self._lines: List[str] = []
+        self._lock = threading.Lock()
+
+    def append(self, item: Any) -> bool:
+        """Queue an item; True when a write() has to be scheduled for it."""
+        line = json.dumps(item, default=_json_default, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._lines.append(line)
+            return len(self._lines) == 1
+
+    def write(self) -> bool:
+        with self._lock:
+            lines, self._lines = self._lines, []
+        if not lines:
+            return True
+        try:
+            if self.file is None:
+                self.file = open(self.path, "x", encoding="utf-8")
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.file.write("".join(lines))
+            self.file.flush()
+            return True
+        except OSError as e:
+            print(f"Error spooling {len(lines)} items to {self.path}: {e}")
+            return False
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+    def discard(self) -> None:
+        if self.file is None:
+            return
+        os.unlink(self.path)
+        self.file.close()
+
+
+class WriteBehind:
+    """Bounded in-memory buffer whose items are written in batches.
+
+    ``submit()`` only appends to the buffer. A background task hands the
+    buffered items to ``handler`` as lists of at most ``flush_rows`` every
+    ``flush_interval`` seconds, or as soon as ``flush_rows`` items are waiting,
+    so the database sees one transaction per batch instead of one per item.
+    Like ``Dispatcher``, sync handlers run in a worker thread and coroutine
+    handlers are awaited, and the oldest item is dropped when the buffer is full.
+    A batch whose handler raises goes back to the front of the buffer and is
+    retried with the next flush, up to ``max_attempts`` times.
+    ``stop()`` flushes everything that is left.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Any],
+        name: str,
+        maxsize: int = 10000,
+        flush_rows: int = 500,
+        flush_interval: float = 0.25,
+        durability: str = MEMORY,
+        spool_dir: Optional[str] = None,
+        decode: Optional[Callable[[Any], Any]] = None,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability {durability!r}, expected one of {DURABILITY_MODES}")
+        if durability == SPOOL and not spool_dir:
+            raise ValueError("Spool durability needs a spool_dir")
+        self.handler = handler
+        self.name = name
+        self.maxsize = maxsize
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.spool_dir = spool_dir
+        self.decode = decode
+        self.max_attempts = max(1, max_attempts)
+        # (submitted at, item, failed attempts)
+        self._buffer: deque = deque()
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._segment: Optional[_Segment] = None
+        # Spool file I/O, kept off the event loop; one thread keeps it in order
+        self._spool_thread: Optional[ThreadPoolExecutor] = None
+        # Keeps segment names unique even when an earlier process had the same PID
+        self._run_id = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.recovered = 0
+        self.batches = 0
+        self.last_batch_seconds = 0.0
+        self.max_lag = 0.0
+
+    def submit(self, item: Any) -> bool:
+        """Buffer an item without blocking. Returns False if an older item was dropped."""
+        self._spool(item)
+        return self._enqueue(item)
+
+    def _enqueue(self, item: Any) -> bool:
+        accepted = True
+        if len(self._buffer) >= self.maxsize:
+            self._buffer.popleft()
+            self.dropped += 1
+            accepted = False
+        self._buffer.append((time.monotonic(), item, 0))
+        self.submitted += 1
+        if self._full is not None and len(self._buffer) >= self.flush_rows:
+            self._full.set()
+        return accepted
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._full = asyncio.Event()
+        if self.durability == SPOOL:
+            self._spool_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.name}-spool")
+            self._segment = self._next_segment()
+            for item in await self._in_spool_thread(self._recover):
+                self._enqueue(item)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write out everything still buffered."""
+        if self._task is None:
+            return
+        # Let a flush in progress finish rather than cancelling it halfway through its batches
+        self._stopping = True
+        self._full.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+        if self._segment is not None:
+            if self._buffer:
+                # Still failing after the final flush: leave the spool file to be replayed
+                print(f"Keeping {len(self._buffer)} unwritten {self.name} items in {self._segment.path}")
+                await self._in_spool_thread(self._segment.close)
+            else:
+                await self._in_spool_thread(self._segment.discard)
+            self._segment = None
+        if self._spool_thread is not None:
+            self._spool_thread.shutdown(wait=True)
+            self._spool_thread = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing {self.name} buffer: {e}")
+
+    async def flush(self) -> int:
+        """Write every buffered item now; returns how many were written."""
+        if not self._buffer:
+            return 0
+        # Items submitted from here on go to a fresh segment; this one is
+        # deleted once everything it holds has been written or re-spooled
+        sealed = self._segment
+        if sealed is not None:
+            self._segment = self._next_segment()
+        pending = list(self._buffer)
+        self._buffer.clear()
+        self.max_lag = max(self.max_lag, time.monotonic() - pending[0][0])
+
+        written = 0
+        retry = []
+        for i in range(0, len(pending), self.flush_rows):
+            entries = pending[i:i + self.flush_rows]
+            batch = [item for _, item, _ in entries]
+            start = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(self.handler):
+                    await self.handler(batch)
+                else:
+                    await asyncio.to_thread(self.handler, batch)
+                written += len(batch)
+            except Exception as e:
+                print(f"Error writing {len(batch)} {self.name} items: {e}")
+                for submitted, item, attempts in entries:
+                    if attempts + 1 >= self.max_attempts:
+                        self.failed += 1
+                    else:
+                        retry.append((submitted, item, attempts + 1))
+            self.batches += 1
+            self.last_batch_seconds = time.perf_counter() - start
+        self.written += written
+
+        if retry:
+            # Ahead of the items submitted meanwhile, and into the new segment
+            # so they still survive a crash once the sealed one is gone
+            self.retried += len(retry)
+            self._buffer.extendleft(reversed(retry))
+            while len(self._buffer) > self.maxsize:
+                self._buffer.popleft()
+                self.dropped += 1
+            for _, item, _ in retry:
+                self._spool(item)
+        if sealed is not None:
+            await self._in_spool_thread(sealed.discard)
+        return written
+
+    def _spool(self, item: Any) -> None:
+        segment = self._segment
+        if segment is not None and segment.append(item):
+            self._spool_thread.submit(segment.write)
+
+    async def _in_spool_thread(self, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` after the spool writes scheduled so far."""
+        return await asyncio.wrap_future(self._spool_thread.submit(fn))
+
+    def _next_segment(self) -> _Segment:
+        self._sequence += 1
+        return _Segment(os.path.join(self.spool_dir, f"{self.name}-{os.getpid()}-{self._run_id}-{self._sequence}.jsonl"))
+
+    def _recover(self) -> List[Any]:
+        """Read the items of spool files whose process died before flushing them (in the spool thread)."""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        recovered = []
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, f"{self.name}-*.jsonl"))):
+            if path == self._segment.path:
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        # Still owned by a running worker
+                        continue
+                    items = []
+                    for line in f:
+                        try:
+                            item = json.loads(line)
+                        except ValueError:
+                            # Torn last line from the crash
+                            continue
+                        items.append(item)
+                    # Into our own segment first, so the orphan can go
+                    for item in items:
+                        self._segment.append(item)
+                    if not self._segment.write():
+                        continue
+                    recovered.extend(self.decode(item) if self.decode else item for item in items)
+                    self.recovered += len(items)
+                    os.unlink(path)
+            except OSError as e:
+                print(f"Error recovering {path}: {e}")
+        return recovered
+
+    def stats(self) -> Dict[str, Any]:
+        oldest = self._buffer[0][0] if self._buffer else None
+        return {
+            "depth": len(self._buffer),
+            "maxsize": self.maxsize,
+            "flush_rows": self.flush_rows,
+            "flush_interval_seconds": self.flush_interval,
+            "durability": self.durability,
+            "running": self._task is not None,
+            "submitted": self.submitted,
+            "written": self.written,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "recovered": self.recovered,
+            "batches": self.batches,
+            "last_batch_seconds": round(self.last_batch_seconds, 3),
+            "lag_seconds": round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+            "max_lag_seconds": round(self.max_lag, 3),
+        }